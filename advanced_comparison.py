@@ -1,15 +1,18 @@
 # advanced_comparison.py
+import os
 import numpy as np
 import tensorflow as tf
 try:
     from tensorflow.keras.applications.vgg16 import VGG16, preprocess_input
+    from tensorflow.keras.applications import MobileNetV3Small
+    from tensorflow.keras.applications.mobilenet_v3 import preprocess_input as mobilenet_v3_preprocess_input
     from tensorflow.keras.models import Model
-    from tensorflow.keras.layers import GlobalAveragePooling2D
-    from tensorflow.keras.utils import img_to_array
+    from tensorflow.keras.layers import GlobalAveragePooling2D, Activation
 except ImportError:
     print("ERROR: TensorFlow/Keras not found. Please install it: pip install tensorflow")
     # You might exit here or disable the advanced feature
     VGG16 = None # Set to None to allow checking later
+    MobileNetV3Small = preprocess_input = mobilenet_v3_preprocess_input = None
 
 try:
     from PIL import Image
@@ -17,47 +20,178 @@ except ImportError:
     print("ERROR: Pillow not found. Please install it: pip install Pillow")
     Image = None # Set to None
 
-from scipy.spatial.distance import cosine
-import os
+try:
+    import simsimd # SIMD (AVX2/AVX-512/NEON) distance kernels
+except ImportError:
+    simsimd = None # int8 comparisons fall back to float32 dot products
+
+import functools
+import threading
+
+def _quantize_int8(features):
+    """Quantize feature rows to int8 with a per-row symmetric scale.
+    Cosine similarity is scale-invariant, so the scales do not need to be kept."""
+    features = np.atleast_2d(np.asarray(features, dtype=np.float32))
+    scale = np.abs(features).max(axis=1, keepdims=True)
+    scale[scale == 0] = 1.0 # All-zero rows stay all-zero
+    return np.round(features * (127.0 / scale)).astype(np.int8)
+
+def _l2_normalize(features):
+    """Scale feature rows to unit length so cosine similarity is a plain dot product.
+    All-zero rows stay all-zero (and so score 0 against everything)."""
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    features /= norms
+    return features
+
+# ImageNet channel means in BGR order, as subtracted by vgg16.preprocess_input ('caffe' mode)
+_VGG16_BGR_MEAN_NP = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+_VGG16_BGR_MEAN = tf.constant(_VGG16_BGR_MEAN_NP)
+
+def _vgg16_preprocess_tf(img):
+    """RGB -> BGR and mean subtraction, matching vgg16.preprocess_input."""
+    return tf.reverse(img, axis=[-1]) - _VGG16_BGR_MEAN
+
+def _passthrough_preprocess_tf(img):
+    """MobileNetV3 rescales its [0, 255] RGB input inside the model."""
+    return img
+
+# backbone name -> (constructor, NumPy preprocess_input, TF preprocessing for the tf.data pipeline)
+_BACKBONES = {
+    'vgg16': (VGG16, preprocess_input, _vgg16_preprocess_tf),
+    'mobilenet_v3_small': (MobileNetV3Small, mobilenet_v3_preprocess_input, _passthrough_preprocess_tf),
+}
+
+@tf.function
+def _preprocess_tf(encoded_image):
+    """Decode, resize and vertically flip one encoded image as TF ops, returning [0, 255] RGB."""
+    img = tf.io.decode_image(encoded_image, channels=3, expand_animations=False)
+    # Bilinear, matching the PIL path used for reference images
+    img = tf.image.resize(img, (224, 224), method='bilinear', antialias=True)
+    # Flip vertically after the resize so the flip only touches the 224x224 tensor
+    return tf.image.flip_up_down(img)
+
+def _comparison_dataset(image_paths, batch_size, backbone='vgg16'):
+    """Builds a tf.data pipeline yielding (indices, preprocessed batch) for the comparison images.
+    Unreadable images are dropped; their indices simply never appear."""
+    backbone_preprocess_tf = _BACKBONES[backbone][2]
+    ds = tf.data.Dataset.from_tensor_slices((tf.range(len(image_paths)), tf.constant(image_paths)))
+    # Files are read concurrently; decode/preprocess overlap with the reads and with inference
+    ds = ds.interleave(lambda i, path: tf.data.Dataset.from_tensors((i, tf.io.read_file(path))),
+                       num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.map(lambda i, encoded: (i, backbone_preprocess_tf(_preprocess_tf(encoded))),
+                num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.ignore_errors()
+    return ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+_MODELS = {} # backbone -> model, loaded once per process and shared by every ImageComparator
+_MODEL_LOCK = threading.Lock()
+
+def _mixed_precision_policy():
+    """16-bit compute policy for inference: mixed_float16 when a GPU is present, else None.
+    CPUs stay at float32, since bfloat16 is only faster on CPUs with AMX/AVX512-BF16."""
+    try:
+        return 'mixed_float16' if tf.config.list_physical_devices('GPU') else None
+    except Exception:
+        return None
+
+def _load_model(backbone='vgg16'):
+    """Loads the feature-extraction model for the given backbone."""
+    constructor = _BACKBONES[backbone][0]
+    if constructor is None: # Check if import failed
+        print(f"{backbone} model cannot be loaded due to missing TensorFlow/Keras.")
+        return None
+    policy = _mixed_precision_policy()
+    previous_policy = tf.keras.mixed_precision.global_policy()
+    try:
+        print(f"Loading {backbone} model (this may take a moment)...")
+        if policy is not None:
+            # Layers built under this policy keep f32 weights but compute in 16-bit
+            tf.keras.mixed_precision.set_global_policy(policy)
+        # Using pooling='avg' simplifies the model creation slightly
+        base_model = constructor(weights='imagenet', include_top=False, input_shape=(224, 224, 3), pooling='avg')
+        # The model directly outputs the GAP features now, cast back to float32 for the cosine maths
+        outputs = Activation('linear', dtype='float32')(base_model.output) if policy else base_model.output
+        model = Model(inputs=base_model.input, outputs=outputs)
+        print(f"{backbone} model loaded successfully{f' ({policy})' if policy else ''}.")
+        return model
+    except Exception as e:
+        print(f"Error loading {backbone} model: {e}")
+        print("Ensure you have an internet connection for the first download.")
+        return None
+    finally:
+        # Only this model should be built in 16-bit, not anything the caller builds later
+        tf.keras.mixed_precision.set_global_policy(previous_policy)
+
+def _get_model(backbone='vgg16'):
+    """Returns the shared model for a backbone, loading it on first use."""
+    if _MODELS.get(backbone) is None:
+        with _MODEL_LOCK: # Concurrent first requests must not build the model twice
+            if _MODELS.get(backbone) is None:
+                _MODELS[backbone] = _load_model(backbone)
+    return _MODELS[backbone]
+
+_INFERS = {} # (backbone, batch_size) -> XLA-compiled forward pass for its model
+
+def _build_infer(model, batch_size):
+    """Wraps the forward pass in an XLA-compiled tf.function specialised on (batch_size, 224, 224, 3) float32.
+    Callers pad smaller batches to this shape, so XLA compiles exactly once."""
+    try:
+        infer = tf.function(lambda x: model(x, training=False), jit_compile=True)
+        infer = infer.get_concrete_function(tf.TensorSpec([batch_size, 224, 224, 3], tf.float32))
+        # Throwaway call so XLA compilation happens at load time, not on the first request
+        infer(tf.zeros((batch_size, 224, 224, 3), tf.float32))
+        return infer
+    except Exception as e:
+        print(f"Could not compile forward pass, using eager calls: {e}")
+        return None
+
+def _get_infer(backbone='vgg16', batch_size=32):
+    """Returns the shared compiled forward pass, or None if the model or compilation is unavailable."""
+    model = _get_model(backbone)
+    key = (backbone, batch_size)
+    if _INFERS.get(key) is None and model is not None:
+        with _MODEL_LOCK:
+            if _INFERS.get(key) is None:
+                _INFERS[key] = _build_infer(model, batch_size)
+    return _INFERS.get(key)
 
 class ImageComparator:
-    """Compares images using VGG16 features."""
-    def __init__(self):
-        self.model = self._load_vgg16_model()
-
-    def _load_vgg16_model(self):
-        """Loads the VGG16 model."""
-        if VGG16 is None: # Check if import failed
-            print("VGG16 model cannot be loaded due to missing TensorFlow/Keras.")
-            return None
-        try:
-            print("Loading VGG16 model (this may take a moment)...")
-            # Using pooling='avg' simplifies the model creation slightly
-            base_model = VGG16(weights='imagenet', include_top=False, input_shape=(224, 224, 3), pooling='avg')
-            # The model directly outputs the GAP features now
-            model = Model(inputs=base_model.input, outputs=base_model.output)
-            print("VGG16 model loaded successfully.")
-            return model
-        except Exception as e:
-            print(f"Error loading VGG16 model: {e}")
-            print("Ensure you have an internet connection for the first download.")
-            return None
+    """Compares images using CNN features (VGG16 by default, or a lighter backbone)."""
+    def __init__(self, backbone='vgg16', batch_size=32):
+        if backbone not in _BACKBONES:
+            print(f"Unknown backbone '{backbone}'. Choose from: {', '.join(_BACKBONES)}")
+            self.model = None
+            return
+        self.backbone = backbone
+        self.model = _get_model(backbone)
+        self.batch_size = max(1, int(batch_size))
+        self._infer = _get_infer(backbone, self.batch_size)
+        self._preprocess_input = _BACKBONES[backbone][1]
+        self._batch_buf = np.empty((1, 224, 224, 3), dtype=np.float32) # Reused by every PIL image
 
     def _preprocess_pil_image(self, pil_img):
-        """Preprocess PIL image for VGG16"""
+        """Preprocess PIL image for the backbone"""
         if self.model is None: return None
         try:
-            # Ensure image is RGB and correct size
-            img = pil_img.convert('RGB').resize((224, 224))
-            img_array = img_to_array(img)
-            img_array = np.expand_dims(img_array, axis=0)
-            return preprocess_input(img_array)
+            # Ensure image is RGB and correct size, skipping the copies when it already is
+            img = pil_img if pil_img.mode == 'RGB' else pil_img.convert('RGB')
+            if img.size != (224, 224):
+                img = img.resize((224, 224), Image.BILINEAR)
+            buf = self._batch_buf
+            if self.backbone == 'vgg16':
+                # Caffe preprocessing in place: write RGB -> BGR straight into the buffer, then centre
+                np.copyto(buf[0], np.asarray(img)[..., ::-1])
+                buf -= _VGG16_BGR_MEAN_NP
+                return buf
+            np.copyto(buf[0], np.asarray(img))
+            return self._preprocess_input(buf)
         except Exception as e:
              print(f"Error during image preprocessing: {e}")
              return None
 
     def get_features(self, image_path_or_pil_img):
-        """Extract features from an image (path or PIL object) using VGG16"""
+        """Extract features from an image (path, PIL object or uint8 numpy array) using the backbone"""
         if self.model is None: return None
         try:
             if isinstance(image_path_or_pil_img, str): # If it's a path
@@ -65,98 +199,235 @@ class ImageComparator:
                       print(f"Error: Image path does not exist: {image_path_or_pil_img}")
                       return None
                  img = Image.open(image_path_or_pil_img)
+                 # Let libjpeg decode large JPEGs at a reduced scale (no-op for other formats)
+                 img.draft('RGB', (224, 224))
             elif isinstance(image_path_or_pil_img, Image.Image): # If it's a PIL image
                  img = image_path_or_pil_img
+            elif isinstance(image_path_or_pil_img, np.ndarray): # In-memory image, e.g. a rendered mask
+                 img = Image.fromarray(image_path_or_pil_img)
             else:
-                 print("Error: Invalid input for get_features. Expecting path or PIL Image.")
+                 print("Error: Invalid input for get_features. Expecting path, PIL Image or numpy array.")
                  return None
 
             img_array = self._preprocess_pil_image(img)
             if img_array is None: return None
 
-            features = self.model.predict(img_array, verbose=0)
-            return features.flatten()
+            features = self.get_features_batch(img_array)
+            return features[0] if features is not None else None
         except Exception as e:
             print(f"Error extracting features from image: {e}")
             return None
 
+    def get_features_batch(self, img_batch):
+        """Extract L2-normalized features for a preprocessed (N, 224, 224, 3) batch in one forward pass."""
+        if self.model is None: return None
+        try:
+            features = None
+            if self._infer is not None:
+                try:
+                    features = self._infer_padded(img_batch)
+                except Exception as e:
+                    print(f"Compiled forward pass failed, falling back to eager: {e}")
+                    self._infer = None
+            if features is None:
+                # Calling the model directly skips predict()'s per-call data adapter setup
+                features = np.array(self.model(img_batch, training=False)) # Writable copy; _l2_normalize works in place
+            return _l2_normalize(features.reshape(len(img_batch), -1).astype(np.float32, copy=False))
+        except Exception as e:
+            print(f"Error extracting batch features: {e}")
+            return None
+
+    def _infer_padded(self, img_batch):
+        """Runs the compiled forward pass in chunks of batch_size. A short last chunk is zero-padded
+        to the compiled shape when it is at least half full; smaller ones (such as a single
+        reference image) go through the eager model instead of paying for a full padded batch."""
+        n = len(img_batch)
+        outputs = []
+        for start in range(0, n, self.batch_size):
+            chunk = tf.convert_to_tensor(img_batch[start:start + self.batch_size], dtype=tf.float32)
+            rows = int(chunk.shape[0])
+            if rows * 2 < self.batch_size:
+                outputs.append(np.array(self.model(chunk, training=False)))
+                continue
+            if rows < self.batch_size:
+                chunk = tf.pad(chunk, [[0, self.batch_size - rows], [0, 0], [0, 0], [0, 0]])
+            outputs.append(self._infer(chunk).numpy()[:rows])
+        return np.concatenate(outputs) if len(outputs) > 1 else outputs[0]
+
     def compare_features(self, features1, features2):
-        """Compare two feature vectors using cosine similarity."""
+        """Cosine similarity of two normalized feature vectors (as returned by get_features)."""
         if features1 is None or features2 is None:
             print("Cannot compare None features.")
             return 0.0 # Return lowest similarity if features missing
-        # Ensure vectors are not zero vectors before calculating cosine similarity
-        if np.all(features1 == 0) or np.all(features2 == 0):
-            # print("Warning: One or both feature vectors are all zeros.")
-            return 0.0 # Or handle as appropriate (e.g., 1.0 if both are zero?)
-        try:
-             # Cosine distance is 1 - similarity
-             similarity = 1 - cosine(features1, features2)
-             # Handle potential NaN result if vectors somehow are invalid after checks
-             return similarity if not np.isnan(similarity) else 0.0
-        except Exception as e:
-             print(f"Error calculating cosine similarity: {e}")
-             return 0.0
+        # Unit vectors: cosine is just the dot product, and zero vectors score 0
+        return float(np.dot(features1, features2))
+
+    def compare_features_batch(self, ref_features, feature_matrix, quantize_int8=False):
+        """Cosine similarity of every (normalized) row of feature_matrix against the normalized
+        ref_features, as a single matrix-vector product.
+        With quantize_int8 (requires simsimd) features are compared as int8 vectors, which
+        quarters the bytes read and uses the VNNI dot-product kernels."""
+        if ref_features is None or feature_matrix is None or len(feature_matrix) == 0:
+            return np.zeros(0 if feature_matrix is None else len(feature_matrix), dtype=np.float32)
+        if simsimd is not None and quantize_int8:
+            distances = simsimd.cdist(_quantize_int8(feature_matrix), _quantize_int8(ref_features),
+                                      metric='cosine', dtype='int8')
+            return np.nan_to_num(1.0 - np.asarray(distances).ravel(), nan=0.0)
+        return np.asarray(feature_matrix, dtype=np.float32) @ np.asarray(ref_features, dtype=np.float32)
 
-def run_vgg16_comparison(reference_image_path, comparison_image_paths):
+def _file_size(path):
+    """Size of a file in bytes, or 0 if it cannot be stat'ed (it will fail in the pipeline anyway)."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def _file_mtime(path):
+    """Modification time of a file, or NaN if it cannot be stat'ed (never matches a cached entry)."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return float('nan')
+
+def _load_embeddings_cache(cache_path, dim):
+    """Returns {path: (mtime, features)} from an embeddings cache file, or {} if missing/unusable."""
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with np.load(cache_path, allow_pickle=False) as npz:
+            paths, mtimes, features = npz['paths'].tolist(), npz['mtimes'], npz['features']
+        if features.ndim != 2 or features.shape[1] != dim:
+            return {} # Written by a different backbone
+        return {path: (mtimes[i], features[i]) for i, path in enumerate(paths)}
+    except Exception as e:
+        print(f"Ignoring unreadable embeddings cache {cache_path}: {e}")
+        return {}
+
+def _save_embeddings_cache(cache_path, paths, mtimes, features):
+    """Writes normalized comparison embeddings and their source mtimes to an .npz cache file."""
+    try:
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        tmp_path = f'{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp.npz'
+        np.savez(tmp_path, paths=np.array(paths, dtype=str), mtimes=np.asarray(mtimes, dtype=np.float64),
+                 features=features)
+        os.replace(tmp_path, cache_path) # Readers never see a partly written file
+    except Exception as e:
+        print(f"Could not write embeddings cache {cache_path}: {e}")
+
+@functools.lru_cache(maxsize=128)
+def _cached_ref_features(path, mtime, backbone='vgg16', batch_size=32):
+    """Reference features memoized by (path, mtime, backbone, batch_size), so repeat runs skip the forward pass.
+    Raises ValueError on failure so that failed extractions are not cached."""
+    features = ImageComparator(backbone, batch_size).get_features(path)
+    if features is None:
+        raise ValueError(f"no features for {path}")
+    features.setflags(write=False) # Shared between callers
+    return features
+
+def run_vgg16_comparison(reference_image_path, comparison_image_paths, batch_size=32,
+                         quantize_int8=False, backbone='vgg16', top_k=None, embeddings_cache_path=None):
     """
-    Performs VGG16 comparison between a reference image and vertically
+    Performs VGG16 (or other backbone) feature comparison between a reference image and vertically
     flipped versions of comparison images.
 
     Args:
-        reference_image_path (str): Path to the reference image.
+        reference_image_path (str or np.ndarray): Path to the reference image, or the image itself
+            as a uint8 array (grayscale or RGB), which skips the PNG write/read round trip.
         comparison_image_paths (list): List of paths to comparison images.
+        batch_size (int): Number of comparison images per forward pass.
+            Lower it to reduce peak memory.
+        quantize_int8 (bool): Compare int8-quantized features (needs simsimd).
+            Similarities differ from float32 by roughly 1e-3.
+        backbone (str): Feature extractor, 'vgg16' or 'mobilenet_v3_small'
+            (~50x fewer FLOPs; scores are not comparable across backbones).
+        top_k (int, optional): Only return the top_k most similar images.
+        embeddings_cache_path (str, optional): .npz file caching comparison-image embeddings.
+            Images whose mtime matches their cached entry skip the forward pass; only the
+            reference and new or changed images are run through the model.
 
     Returns:
-        list: Sorted list of tuples (comparison_path, similarity_score).
+        list: Sorted list of tuples (comparison_path, similarity_score), top_k long if given.
               Returns empty list on major errors (e.g., model load failure).
     """
     if Image is None or VGG16 is None:
         print("Cannot run advanced comparison due to missing libraries (Pillow or TensorFlow).")
         return []
 
-    comparator = ImageComparator()
+    batch_size = max(1, int(batch_size))
+    comparator = ImageComparator(backbone, batch_size)
     if comparator.model is None:
-        print("Failed to initialize VGG16 model. Aborting advanced comparison.")
+        print(f"Failed to initialize {backbone} model. Aborting advanced comparison.")
         return []
 
     print("Extracting features for reference image...")
-    ref_features = comparator.get_features(reference_image_path)
+    if isinstance(reference_image_path, np.ndarray):
+        ref_features = comparator.get_features(reference_image_path)
+    else:
+        try:
+            ref_features = _cached_ref_features(reference_image_path, os.path.getmtime(reference_image_path),
+                                                backbone, batch_size)
+        except (OSError, ValueError):
+            ref_features = None
     if ref_features is None:
-        print(f"Failed to get features for reference image: {reference_image_path}. Aborting.")
+        print("Failed to get features for reference image. Aborting.")
         return []
     print("Reference features extracted.")
 
-    similarities = []
     total_files = len(comparison_image_paths)
-    print(f"Comparing with {total_files} images (using vertical flip)...")
+    print(f"Comparing with {total_files} images (using vertical flip, batch size {batch_size})...")
 
-    for i, comp_path in enumerate(comparison_image_paths):
-        # Provide progress update
-        if (i + 1) % 10 == 0 or i == total_files - 1:
-             print(f"Processing comparison image {i+1}/{total_files}...")
-        try:
-            comp_img = Image.open(comp_path)
-            # Flip comparison image vertically IN MEMORY
-            flipped_comp_img = comp_img.transpose(Image.FLIP_TOP_BOTTOM)
-            # Get features for the flipped image
-            comp_features_flipped = comparator.get_features(flipped_comp_img)
-
-            if comp_features_flipped is not None:
-                similarity = comparator.compare_features(ref_features, comp_features_flipped)
-                similarities.append((comp_path, similarity))
-            else:
-                 print(f"Could not get features for (flipped) {comp_path}")
-                 similarities.append((comp_path, 0.0)) # Assign 0 similarity on feature error
+    # One row per comparison image, filled in place; rows left at zero score 0
+    feature_matrix = np.zeros((total_files, len(ref_features)), dtype=np.float32)
+    processed = np.zeros(total_files, dtype=bool)
 
-        except FileNotFoundError:
-            print(f"Comparison image not found: {comp_path}. Skipping.")
-            similarities.append((comp_path, 0.0))
-        except Exception as e:
-            print(f"Error processing comparison image {comp_path}: {e}")
-            similarities.append((comp_path, 0.0)) # Assign 0 similarity on other errors
+    if embeddings_cache_path:
+        cached = _load_embeddings_cache(embeddings_cache_path, len(ref_features))
+        mtimes = [_file_mtime(path) for path in comparison_image_paths]
+        for i, path in enumerate(comparison_image_paths):
+            entry = cached.get(path)
+            if entry is not None and entry[0] == mtimes[i]:
+                feature_matrix[i] = entry[1]
+                processed[i] = True
+        if processed.any():
+            print(f"Reusing cached embeddings for {int(processed.sum())}/{total_files} images.")
+    reused = processed.copy()
+
+    pending = np.flatnonzero(~processed)
+    if len(pending):
+        # Feed images smallest-first so each batch holds similar decode costs;
+        # the pipeline's indices refer to this order and are mapped back below
+        order = pending[np.argsort([_file_size(comparison_image_paths[i]) for i in pending], kind='stable')]
+        ordered_paths = [comparison_image_paths[i] for i in order]
+        # Read, decode, flip and resize run inside the tf.data pipeline, overlapped with inference
+        for batch_indices, batch_images in _comparison_dataset(ordered_paths, batch_size, backbone):
+            batch_indices = order[batch_indices.numpy()]
+            batch_features = comparator.get_features_batch(batch_images)
+            if batch_features is None:
+                print(f"Could not get features for a batch of {len(batch_indices)} images")
+                continue
+            feature_matrix[batch_indices] = batch_features
+            processed[batch_indices] = True
+            print(f"Processing comparison image {int(processed.sum())}/{total_files}...")
+
+    if embeddings_cache_path and (processed & ~reused).any():
+        # Rewrite the cache with this run's embeddings plus any other images it already held
+        for i in np.flatnonzero(processed):
+            cached[comparison_image_paths[i]] = (mtimes[i], feature_matrix[i])
+        paths = list(cached)
+        _save_embeddings_cache(embeddings_cache_path, paths, [cached[p][0] for p in paths],
+                               np.stack([cached[p][1] for p in paths]))
+    # All similarities in a single matrix-vector product over the contiguous feature matrix
+    scores = comparator.compare_features_batch(ref_features, feature_matrix, quantize_int8=quantize_int8)
 
-    # Sort by similarity (highest first)
-    similarities.sort(key=lambda x: x[1], reverse=True)
+    for i in np.flatnonzero(~processed):
+        print(f"Could not process comparison image {comparison_image_paths[i]}. Assigning 0 similarity.")
+    if top_k is not None and 0 < top_k < total_files:
+        # O(N) selection of the best top_k, then sort just those (highest first)
+        order = np.argpartition(scores, -top_k)[-top_k:]
+        order = order[np.argsort(-scores[order], kind='stable')]
+    else:
+        # Sort by similarity (highest first); stable, so ties keep their input order
+        order = np.argsort(-scores, kind='stable')
+    similarities = list(zip([comparison_image_paths[i] for i in order], scores[order].tolist()))
     print("Advanced comparison finished.")
-    return similarities
\ No newline at end of file
+    return similarities
@@ -5,19 +5,38 @@ import json
 import traceback
 import tempfile
 import geopandas as gpd
+import pyogrio
 import pandas as pd
 import numpy as np
 import base64
 import io
+import time
+import functools
+import threading
+import sqlite3
+from collections import OrderedDict
+from contextlib import closing
 from datetime import datetime
 import cv2
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
 
+try:
+    import orjson # C JSON encoder; serializes NumPy scalars/arrays without tolist()
+except ImportError:
+    orjson = None
+
 # Import our utility modules
 import sys
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Project root (one level above backend/) and the folders the API reads and writes
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAPS_DIR = os.path.join(BASE_DIR, "maps")
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+PDF_DIR = os.path.join(BASE_DIR, "pdf_reports")
+for _output_dir in (CACHE_DIR, PDF_DIR):
+    os.makedirs(_output_dir, exist_ok=True) # Created once here so requests never need to
+sys.path.append(BASE_DIR)
 
 import geometry_utils
 import mask_utils
@@ -35,6 +54,21 @@ except ImportError:
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend connectivity
 
+def json_dumps(obj):
+    """Serializes obj to JSON bytes with orjson, falling back to the stdlib json module.
+    Note: orjson writes non-finite floats (e.g. an infinite Hausdorff distance) as null."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=lambda o: o.tolist() if hasattr(o, 'tolist') else str(o)).encode('utf-8')
+
+def json_loads(data):
+    """Parses JSON bytes/str with orjson when available."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def json_response(obj, status=200):
+    """Flask response whose body is encoded by json_dumps."""
+    return app.response_class(json_dumps(obj), status=status, mimetype='application/json')
+
 # Global configuration
 CONFIG_BASE = {
     "image_size": 500,
@@ -48,21 +82,122 @@ CONFIG_BASE = {
     "hausdorff_prioritization_tolerance": 2.0,
 }
 
+def _ttl_cache(seconds, maxsize=128, cache_if=None):
+    """Memoizes a function's results for `seconds`, keeping at most `maxsize` entries.
+
+    Exceptions are not cached, and neither are results rejected by `cache_if`.
+    """
+    def decorator(func):
+        entries = OrderedDict()
+        lock = threading.Lock()
+        @functools.wraps(func)
+        def wrapper(*args):
+            now = time.monotonic()
+            with lock:
+                hit = entries.get(args)
+            if hit is not None and now - hit[0] < seconds:
+                return hit[1]
+            value = func(*args)
+            if cache_if is None or cache_if(value):
+                with lock:
+                    entries[args] = (now, value)
+                    entries.move_to_end(args)
+                    while len(entries) > maxsize:
+                        entries.popitem(last=False)  # Drop the oldest entry
+            return value
+        wrapper.cache_clear = entries.clear
+        return wrapper
+    return decorator
+
+@functools.lru_cache(maxsize=32)
+def _load_shapefile(path, mtime):
+    """Reads a shapefile once per (path, mtime); callers must treat the result as read-only."""
+    return gpd.read_file(path, engine="pyogrio")
+
+def load_shapefile(path):
+    """Returns the cached GeoDataFrame for path, re-reading it if the file has changed."""
+    return _load_shapefile(path, _shapefile_mtime(path))
+
+# Attribute names (lower-cased) that identify a plot in the survey-number listing
+ID_COLS = frozenset({'id', 'plot_id', 'survey_no', 'plot_no', 'number', 'name'})
+
+def _read_survey_numbers(shapefile_path):
+    """Builds the survey-number listing (feature index plus an identifying attribute) from a shapefile."""
+    # Feature count and field names come from the header; geometry is never read
+    info = pyogrio.read_info(shapefile_path, force_feature_count=True)
+    num_features = info['features']
+    # Only the first identifying column is ever reported, so find it once and read just that
+    id_col = next((col for col in info['fields'] if col.lower() in ID_COLS), None)
+    if id_col is None:
+        return [{"index": i} for i in range(num_features)]
+
+    values = pyogrio.read_dataframe(shapefile_path, columns=[id_col], read_geometry=False)[id_col].tolist()
+    key = id_col.lower()
+    return [{"index": i, key: (None if pd.isna(v) else str(v))} for i, v in enumerate(values)]
+
+def _shapefile_mtime(shapefile_path):
+    """Latest mtime of the .shp and its .dbf/.shx sidecars; the attributes live in the .dbf,
+    so an attribute-only edit leaves the .shp untouched."""
+    base = os.path.splitext(shapefile_path)[0]
+    mtimes = [os.path.getmtime(shapefile_path)]
+    for ext in ('.dbf', '.shx'):
+        try:
+            mtimes.append(os.path.getmtime(base + ext))
+        except OSError:
+            pass
+    return max(mtimes)
+
+def load_survey_numbers(village_name, shapefile_path):
+    """Returns the survey-number listing from cache/<village>.sqlite, rebuilding it from the
+    shapefile when the cache is missing or the .shp/.dbf/.shx files have changed."""
+    db_path = os.path.join(CACHE_DIR, f'{village_name}.sqlite')
+    mtime = repr(_shapefile_mtime(shapefile_path))
+    if os.path.exists(db_path):
+        try:
+            with closing(sqlite3.connect(db_path)) as conn:
+                meta = dict(conn.execute("SELECT key, value FROM meta"))
+                if meta.get('shapefile_path') == shapefile_path and meta.get('mtime') == mtime:
+                    rows = conn.execute("SELECT idx, attr, value FROM features ORDER BY idx")
+                    return [{"index": idx, attr: value} if attr is not None else {"index": idx}
+                            for idx, attr, value in rows]
+        except sqlite3.Error as e:
+            print(f"Ignoring unreadable survey cache {db_path}: {e}")
+
+    survey_numbers = _read_survey_numbers(shapefile_path)
+    rows = []
+    for feature in survey_numbers:
+        # Each feature carries at most one attribute besides its index
+        attrs = [(k, v) for k, v in feature.items() if k != "index"]
+        attr, value = attrs[0] if attrs else (None, None)
+        rows.append((feature["index"], attr, value))
+    try:
+        # Build in a temp file and swap it in, so concurrent readers never see a half-written cache
+        tmp_path = f'{db_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with closing(sqlite3.connect(tmp_path)) as conn:
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE features (idx INTEGER PRIMARY KEY, attr TEXT, value TEXT)")
+            conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                             [('shapefile_path', shapefile_path), ('mtime', mtime)])
+            conn.executemany("INSERT INTO features VALUES (?, ?, ?)", rows)
+            conn.commit()
+        os.replace(tmp_path, db_path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Could not write survey cache {db_path}: {e}")
+    return survey_numbers
+
 # Helper functions adapted from main.py
 def get_available_villages():
     """Returns a list of available villages from the maps directory."""
-    maps_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "maps")
     villages = []
     try:
-        for item in os.listdir(maps_dir):
-            village_path = os.path.join(maps_dir, item)
-            if os.path.isdir(village_path):
-                # Check if it has the required structure (dat_folder and panda folder)
-                dat_folder = os.path.join(village_path, "dat_folder")
-                panda_folders = [f for f in os.listdir(village_path) if f.endswith("_panda")]
-                
-                if os.path.exists(dat_folder) and panda_folders:
-                    villages.append(item)
+        with os.scandir(MAPS_DIR) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    # Check if it has the required structure (dat_folder and panda folder)
+                    with os.scandir(entry.path) as village_entries:
+                        names = [e.name for e in village_entries]
+                    if "dat_folder" in names and any(name.endswith("_panda") for name in names):
+                        villages.append(entry.name)
     except Exception as e:
         print(f"Error scanning villages: {e}")
     
@@ -70,8 +205,14 @@ def get_available_villages():
 
 def get_village_structure(village_name):
     """Analyzes village structure and returns sub-villages if any."""
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    dat_folder = os.path.join(base_dir, "maps", village_name, "dat_folder")
+    dat_folder, sub_villages = _get_village_structure_cached(village_name)
+    return dat_folder, list(sub_villages)
+
+# Misses are not cached so a newly added village shows up on the next request
+@_ttl_cache(60, cache_if=lambda result: result[0] is not None)
+def _get_village_structure_cached(village_name):
+    """Directory scan behind get_village_structure, cached for 60 s."""
+    dat_folder = os.path.join(MAPS_DIR, village_name, "dat_folder")
     
     if not os.path.exists(dat_folder):
         return None, []
@@ -79,14 +220,14 @@ def get_village_structure(village_name):
     # Get all subdirectories in dat_folder
     sub_villages = []
     try:
-        for item in os.listdir(dat_folder):
-            item_path = os.path.join(dat_folder, item)
-            if os.path.isdir(item_path):
-                # Check if it has dat and dat_image folders
-                dat_subfolder = os.path.join(item_path, "dat")
-                dat_image_subfolder = os.path.join(item_path, "dat_image")
-                if os.path.exists(dat_subfolder) and os.path.exists(dat_image_subfolder):
-                    sub_villages.append(item)
+        with os.scandir(dat_folder) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    # Check if it has dat and dat_image folders
+                    with os.scandir(entry.path) as sub_entries:
+                        names = {e.name for e in sub_entries}
+                    if "dat" in names and "dat_image" in names:
+                        sub_villages.append(entry.name)
     except Exception as e:
         print(f"Error scanning sub-villages for {village_name}: {e}")
     
@@ -94,8 +235,13 @@ def get_village_structure(village_name):
 
 def setup_config_for_village(village_name):
     """Sets up configuration for a specific village."""
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    
+    config = _setup_config_cached(village_name)
+    # Callers get their own copy so the cached entry cannot be modified
+    return dict(config, sub_villages=list(config["sub_villages"]))
+
+@_ttl_cache(60)
+def _setup_config_cached(village_name):
+    """Directory scan behind setup_config_for_village, cached for 60 s."""
     # Analyze village structure
     dat_folder_base, sub_villages = get_village_structure(village_name)
     
@@ -104,21 +250,23 @@ def setup_config_for_village(village_name):
     
     # Find the shapefile
     panda_folder = None
-    village_path = os.path.join(base_dir, "maps", village_name)
-    for item in os.listdir(village_path):
-        if item.endswith("_panda"):
-            panda_folder = os.path.join(village_path, item)
-            break
+    village_path = os.path.join(MAPS_DIR, village_name)
+    with os.scandir(village_path) as entries:
+        for entry in entries:
+            if entry.name.endswith("_panda"):
+                panda_folder = entry.path
+                break
     
     if not panda_folder:
         raise ValueError(f"No panda folder found for {village_name}")
     
     # Find the shapefile in the panda folder
     shapefile_path = None
-    for file in os.listdir(panda_folder):
-        if file.endswith(".shp"):
-            shapefile_path = os.path.join(panda_folder, file)
-            break
+    with os.scandir(panda_folder) as entries:
+        for entry in entries:
+            if entry.name.endswith(".shp"):
+                shapefile_path = entry.path
+                break
     
     if not shapefile_path:
         raise ValueError(f"No shapefile found in {panda_folder}")
@@ -126,7 +274,7 @@ def setup_config_for_village(village_name):
     # Set up the main map image path
     full_map_image_path = None
     if sub_villages:
-        potential_map_path = os.path.join(base_dir, "maps", village_name, "plots", sub_villages[0], "map.jpg")
+        potential_map_path = os.path.join(MAPS_DIR, village_name, "plots", sub_villages[0], "map.jpg")
         if os.path.exists(potential_map_path):
             full_map_image_path = potential_map_path
     
@@ -145,7 +293,6 @@ def generate_references_api(data, chosen_index, config):
     """Generates reference mask and potentially saves reference image."""
     reference_mask = None
     reference_image_path = None
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     
     try:
         selected_geometry = data.loc[chosen_index, 'geometry']
@@ -166,14 +313,14 @@ def generate_references_api(data, chosen_index, config):
             raise ValueError(f"Reference mask for index {chosen_index} is empty.")
 
         if config["save_reference_image"]:
-            ref_folder = os.path.join(base_dir, config["reference_image_folder"])
+            ref_folder = os.path.join(BASE_DIR, config["reference_image_folder"])
             os.makedirs(ref_folder, exist_ok=True)
             shapefile_basename = os.path.splitext(os.path.basename(config["shapefile_path"]))[0]
             ref_img_filename = f"{shapefile_basename}_ref_idx{chosen_index}.png"
             reference_image_path = os.path.join(ref_folder, ref_img_filename)
             
-            ref_img_display = np.ones((config["image_size"], config["image_size"]), dtype=np.uint8) * 255
-            ref_img_display[reference_mask == 1] = 0  # Black shape
+            # Black shape on white, built in a single pass
+            ref_img_display = np.where(reference_mask == 1, np.uint8(0), np.uint8(255))
             cv2.imwrite(reference_image_path, ref_img_display)
             
         return reference_mask, reference_image_path
@@ -189,45 +336,46 @@ def run_comparison_api(reference_mask, reference_image_path, comparison_method,
     best_match_score_info = ""
 
     if comparison_method == 'standard':
-        total_processed_files = 0
-        temp_results = []
-        
-        # Iterate through all sub-villages
+        # Collect (dat_filename, sub_village, path) for all sub-villages, then compare them in parallel
+        comparison_tasks = []
         for sub_village in config['sub_villages']:
             comparison_dat_folder = os.path.join(config['dat_folder_base'], sub_village, 'dat')
             
             try:
-                all_comparison_files = [f for f in os.listdir(comparison_dat_folder) if f.lower().endswith('.dat')]
-                if not all_comparison_files: 
-                    continue
+                with os.scandir(comparison_dat_folder) as entries:
+                    comparison_tasks.extend((e.name, sub_village, e.path) for e in entries
+                                            if e.name.lower().endswith('.dat'))
             except Exception as e: 
                 continue
 
-            for dat_filename in all_comparison_files:
-                comparison_dat_path = os.path.join(comparison_dat_folder, dat_filename)
-                comparison_mask = mask_utils.load_dat_as_mask(comparison_dat_path, target_size=(config['image_size'], config['image_size']))
-                if comparison_mask is None: 
-                    continue
-                
-                result = comparison_utils.compare_masks(
-                    reference_mask, comparison_mask,
-                    iou_tolerance=config['iou_prioritization_tolerance'],
-                    hausdorff_tolerance=config['hausdorff_prioritization_tolerance']
-                )
-                total_processed_files += 1
-                
-                temp_results.append({
+        results = comparison_utils.compare_dat_files(
+            reference_mask, [task[2] for task in comparison_tasks],
+            target_size=(config['image_size'], config['image_size']),
+            iou_tolerance=config['iou_prioritization_tolerance'],
+            hausdorff_tolerance=config['hausdorff_prioritization_tolerance'],
+            max_workers=1 # Serial: no worker processes per request next to TensorFlow and the gthread workers
+        )
+        # Per-file results are kept as columns; dicts are only built for the matches returned
+        processed = [i for i, result in enumerate(results) if result is not None]
+        total_processed_files = len(processed)
+        ious = np.fromiter((results[i]["best_iou"] for i in processed), dtype=np.float64, count=total_processed_files)
+        hausdorffs = np.fromiter((results[i]["best_hausdorff"] for i in processed), dtype=np.float64,
+                                 count=total_processed_files)
+        
+        if total_processed_files:
+            # Highest IoU first, ties broken by lowest Hausdorff (stable, so ties keep directory order)
+            top = np.lexsort((hausdorffs, -ious))[:config['top_n_matches']]
+            for j in top:
+                dat_filename, sub_village, _ = comparison_tasks[processed[j]]
+                result = results[processed[j]]
+                comparison_results_list.append({
                     "filename": dat_filename, 
                     "sub_village": sub_village,
-                    "iou": result["best_iou"], 
+                    "iou": float(ious[j]), 
                     "iou_transform": result["best_iou_transform"],
-                    "hausdorff": result["best_hausdorff"], 
+                    "hausdorff": float(hausdorffs[j]), 
                     "hausdorff_transform": result["best_hausdorff_transform"]
                 })
-        
-        if temp_results:
-            temp_results.sort(key=lambda x: (x["iou"], -x["hausdorff"]), reverse=True)
-            comparison_results_list = temp_results
             best_match_found = True
             best_match_source_file = comparison_results_list[0]['filename']
             best_match_sub_village = comparison_results_list[0]['sub_village']
@@ -235,9 +383,6 @@ def run_comparison_api(reference_mask, reference_image_path, comparison_method,
             best_match_score_info = f"IoU: {comparison_results_list[0]['iou']:.3f} (Sub-village: {best_match_sub_village})"
 
     elif comparison_method == 'advanced':
-        if reference_image_path is None or not os.path.exists(reference_image_path):
-            raise ValueError("Reference image needed for advanced comparison not found")
-
         total_comparison_files = []
         
         # Collect all image files from all sub-villages
@@ -245,9 +390,9 @@ def run_comparison_api(reference_mask, reference_image_path, comparison_method,
             original_image_folder = os.path.join(config['dat_folder_base'], sub_village, 'dat_image')
             
             try:
-                comparison_image_files = [os.path.join(original_image_folder, f)
-                                         for f in os.listdir(original_image_folder)
-                                         if f.lower().endswith(config['original_image_extension'])]
+                with os.scandir(original_image_folder) as entries:
+                    comparison_image_files = [e.path for e in entries
+                                              if e.name.lower().endswith(config['original_image_extension'])]
                 if not comparison_image_files:
                     continue
                 
@@ -262,20 +407,21 @@ def run_comparison_api(reference_mask, reference_image_path, comparison_method,
         
         # Extract just the paths for VGG comparison
         image_paths_only = [item[0] for item in total_comparison_files]
-        advanced_results_tuples = advanced_comparison.run_vgg16_comparison(reference_image_path, image_paths_only)
+        # Comparison-image embeddings are cached per village; only the reference (and any new or
+        # changed images) go through the model on later requests
+        embeddings_cache_path = os.path.join(CACHE_DIR, f"vgg_embeddings_{config['village_name']}.npz")
+        # The reference is rendered in memory (same pixels as the saved PNG) rather than re-read from disk
+        ref_img_display = np.where(reference_mask == 1, np.uint8(0), np.uint8(255))
+        advanced_results_tuples = advanced_comparison.run_vgg16_comparison(
+            ref_img_display, image_paths_only, embeddings_cache_path=embeddings_cache_path)
 
         if advanced_results_tuples:
+            path_to_sub_village = dict(total_comparison_files)
             for img_path, similarity in advanced_results_tuples:
-                sub_village_for_path = None
-                for path, sub_village in total_comparison_files:
-                    if path == img_path:
-                        sub_village_for_path = sub_village
-                        break
-                 
                 comparison_results_list.append({
                     'img_path': img_path, 
                     'similarity': similarity,
-                    'sub_village': sub_village_for_path or 'unknown'
+                    'sub_village': path_to_sub_village.get(img_path) or 'unknown'
                 })
              
             best_match_found = True
@@ -309,7 +455,7 @@ def get_village_info(village_name):
         config = setup_config_for_village(village_name)
         
         # Load shapefile to get feature count
-        data = gpd.read_file(config["shapefile_path"])
+        data = load_shapefile(config["shapefile_path"])
         num_features = len(data)
         
         return jsonify({
@@ -329,44 +475,24 @@ def get_village_info(village_name):
 def get_survey_numbers(village_name):
     """Get survey numbers (shapefile feature indices) for a specific village."""
     try:
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        
-        # Find the shapefile
-        village_path = os.path.join(base_dir, "maps", village_name)
+        village_path = os.path.join(MAPS_DIR, village_name)
         if not os.path.exists(village_path):
             return jsonify({
                 'success': False,
                 'error': f'Village {village_name} not found'
             }), 404
         
-        panda_folder = None
-        for item in os.listdir(village_path):
-            if item.endswith("_panda"):
-                panda_folder = os.path.join(village_path, item)
-                break
-        
-        if not panda_folder:
+        # Shapefile discovery is shared with (and cached by) setup_config_for_village
+        try:
+            shapefile_path = setup_config_for_village(village_name)["shapefile_path"]
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'error': f'No panda folder found for {village_name}'
+                'error': str(e)
             }), 404
         
-        # Find the shapefile in the panda folder
-        shapefile_path = None
-        for file in os.listdir(panda_folder):
-            if file.endswith(".shp"):
-                shapefile_path = os.path.join(panda_folder, file)
-                break
-        
-        if not shapefile_path:
-            return jsonify({
-                'success': False,
-                'error': f'No shapefile found in {panda_folder}'
-            }), 404
-        
-        # Read the shapefile and get feature information
-        data = gpd.read_file(shapefile_path)
-        num_features = len(data)
+        survey_numbers = load_survey_numbers(village_name, shapefile_path)
+        num_features = len(survey_numbers)
         
         if num_features == 0:
             return jsonify({
@@ -374,20 +500,6 @@ def get_survey_numbers(village_name):
                 'error': 'Shapefile is empty'
             }), 400
         
-        # Create survey numbers list with feature indices and any available attributes
-        survey_numbers = []
-        for i in range(num_features):
-            feature_info = {"index": i}
-            
-            # Try to get some identifying information from the shapefile attributes
-            row = data.iloc[i]
-            for col in data.columns:
-                if col.lower() != 'geometry' and col.lower() in ['id', 'plot_id', 'survey_no', 'plot_no', 'number', 'name']:
-                    feature_info[col.lower()] = str(row[col]) if pd.notna(row[col]) else None
-                    break
-            
-            survey_numbers.append(feature_info)
-        
         return jsonify({
             'success': True,
             'village_name': village_name,
@@ -411,17 +523,27 @@ def run_comparison():
         chosen_index = data.get('chosen_index')
         comparison_method = data.get('comparison_method', 'standard')
         
-        if not all([village_name, chosen_index is not None, comparison_method]):
+        if not village_name or chosen_index is None or not comparison_method:
             return jsonify({
                 'success': False,
                 'error': 'Missing required parameters: village_name, chosen_index, comparison_method'
             }), 400
+        try:
+            # int() would silently accept True or truncate 2.7
+            if isinstance(chosen_index, bool) or (isinstance(chosen_index, float) and not chosen_index.is_integer()):
+                raise ValueError(chosen_index)
+            chosen_index = int(chosen_index)
+        except (TypeError, ValueError, OverflowError):
+            return jsonify({
+                'success': False,
+                'error': f'chosen_index must be an integer, got {chosen_index!r}'
+            }), 400
         
         # Setup configuration
         config = setup_config_for_village(village_name)
         
         # Load shapefile and validate index
-        shapefile_data = gpd.read_file(config["shapefile_path"])
+        shapefile_data = load_shapefile(config["shapefile_path"])
         if chosen_index < 0 or chosen_index >= len(shapefile_data):
             return jsonify({
                 'success': False,
@@ -454,9 +576,6 @@ def run_comparison():
         session_id = f"{village_name}_{chosen_index}_{comparison_method}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
         # Store session data in a simple file-based cache (for production, use Redis or database)
-        cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache')
-        os.makedirs(cache_dir, exist_ok=True)
-        
         session_data = {
             'config': config,
             'chosen_index': chosen_index,
@@ -468,15 +587,12 @@ def run_comparison():
             'reference_image_path': reference_image_path
         }
         
-        with open(os.path.join(cache_dir, f'{session_id}.json'), 'w') as f:
-            # Convert numpy arrays to lists for JSON serialization
-            if reference_mask is not None:
-                session_data['reference_mask'] = reference_mask.tolist()
-            json.dump(session_data, f)
+        with open(os.path.join(CACHE_DIR, f'{session_id}.json'), 'wb') as f:
+            f.write(json_dumps(session_data))
         
         response_data['session_id'] = session_id
         
-        return jsonify(response_data)
+        return json_response(response_data)
         
     except Exception as e:
         return jsonify({
@@ -489,9 +605,7 @@ def run_comparison():
 def generate_pdf(session_id):
     """Generate PDF report for a comparison session."""
     try:
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        cache_dir = os.path.join(base_dir, 'cache')
-        session_file = os.path.join(cache_dir, f'{session_id}.json')
+        session_file = os.path.join(CACHE_DIR, f'{session_id}.json')
         
         if not os.path.exists(session_file):
             return jsonify({
@@ -500,8 +614,8 @@ def generate_pdf(session_id):
             }), 404
         
         # Load session data
-        with open(session_file, 'r') as f:
-            session_data = json.load(f)
+        with open(session_file, 'rb') as f:
+            session_data = json_loads(f.read())
         
         config = session_data['config']
         chosen_index = session_data['chosen_index']
@@ -521,9 +635,9 @@ def generate_pdf(session_id):
         # Find the best match sub-village and set up plots folder
         best_match_sub_village = results_list[0].get('sub_village', 'unknown')
         potential_plots_folders = [
-            os.path.join(base_dir, "maps", config['village_name'], "plots", best_match_sub_village, "contours"),
-            os.path.join(base_dir, "maps", config['village_name'], "plots", best_match_sub_village),
-            os.path.join(base_dir, "maps", config['village_name'], "plots", best_match_sub_village, "enhanced")
+            os.path.join(MAPS_DIR, config['village_name'], "plots", best_match_sub_village, "contours"),
+            os.path.join(MAPS_DIR, config['village_name'], "plots", best_match_sub_village),
+            os.path.join(MAPS_DIR, config['village_name'], "plots", best_match_sub_village, "enhanced")
         ]
         
         plots_folder_for_pdf = None
@@ -533,15 +647,10 @@ def generate_pdf(session_id):
                 break
         
         if plots_folder_for_pdf is None:
-            plots_folder_for_pdf = os.path.join(base_dir, "maps", config['village_name'], "plots", best_match_sub_village)
-        
-        # Create pdf_reports folder if it doesn't exist
-        pdf_reports_folder = os.path.join(base_dir, "pdf_reports")
-        if not os.path.exists(pdf_reports_folder):
-            os.makedirs(pdf_reports_folder)
+            plots_folder_for_pdf = os.path.join(MAPS_DIR, config['village_name'], "plots", best_match_sub_village)
         
         pdf_output_filename = f"comparison_report_{config['village_name']}_idx{chosen_index}_{comparison_method}.pdf"
-        pdf_output_path = os.path.join(pdf_reports_folder, pdf_output_filename)
+        pdf_output_path = os.path.join(PDF_DIR, pdf_output_filename)
         
         # Generate PDF
         create_pdf_report(
@@ -577,8 +686,7 @@ def generate_pdf(session_id):
 def download_pdf(filename):
     """Download PDF file."""
     try:
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        pdf_path = os.path.join(base_dir, "pdf_reports", filename)
+        pdf_path = os.path.join(PDF_DIR, filename)
         
         if not os.path.exists(pdf_path):
             return jsonify({
@@ -642,4 +750,6 @@ if __name__ == '__main__':
     except ImportError:
         print("Pillow available: False")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server only; use gunicorn (see gunicorn.conf.py) in production.
+    # The debugger and reloader are opt-in via FLASK_DEBUG=1.
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG') == '1', threaded=True)
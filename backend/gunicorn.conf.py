@@ -0,0 +1,19 @@
+# gunicorn.conf.py
+# Production server settings for the backend (Linux/macOS). Run from the backend folder:
+#   gunicorn app:app
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Each worker process holds its own VGG16 model (~550 MB), so keep the process count modest
+# and get request concurrency from threads instead. Threaded workers are used rather than
+# gevent: monkey-patching does not mix with TensorFlow's threads or the comparison process pool.
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+
+# Advanced comparisons on CPU can take well over the default 30 s
+timeout = 300
+
+# Not preloaded: forking after TensorFlow has been imported is not fork-safe
+preload_app = False
@@ -1,24 +1,205 @@
 # comparison_utils.py
+import os
+import threading
+import multiprocessing
+import weakref
 import numpy as np
-import cv2
 from scipy.spatial.distance import directed_hausdorff
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+try:
+    from numba import njit
+except ImportError:
+    njit = None # Optional: packed IoU falls back to NumPy
 # Import functions from our other utility file
 import mask_utils # Assumes mask_utils.py is in the same directory
 
+# Transforms compare_masks tries, and the matching reversed-slice views (no copies)
+FLIP_NAMES = ("Original", "Flipped Horizontally", "Flipped Vertically", "Flipped Both")
+
+_VERT = FLIP_NAMES.index("Flipped Vertically")
+_FLIP_AXES = ((False, False), (True, False), (False, True), (True, True)) # (flip_x, flip_y) per name
+
+def _flips(mask):
+    return (mask, mask[:, ::-1], mask[::-1, :], mask[::-1, ::-1])
+
+# Number of set bits in each byte value, for counting pixels in np.packbits output
+_POPCNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint32)
+
+def _pad_to_words(packed):
+    """Zero-pads the last axis of packbits output to whole 64-bit words (padding adds no set bits)."""
+    pad = -packed.shape[-1] % 8
+    if pad:
+        packed = np.pad(packed, [(0, 0)] * (packed.ndim - 1) + [(0, pad)])
+    return packed
+
+def _pack(mask):
+    """Packs a binary mask to 1 bit per pixel (any nonzero pixel counts as set)."""
+    return _pad_to_words(np.packbits(mask.ravel(order='C')))
+
+def _packed_intersection(a, b):
+    """Number of pixels set in both packed masks (_packed_intersection(a, a) counts a's pixels)."""
+    return _POPCNT8[np.bitwise_and(a, b)].sum(dtype=np.int64)
+
+if njit is not None:
+    from numba import prange
+
+    # SWAR popcount constants; kept as uint64 so numba never promotes the arithmetic to float
+    _M1 = np.uint64(0x5555555555555555)
+    _M2 = np.uint64(0x3333333333333333)
+    _M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+    _H01 = np.uint64(0x0101010101010101)
+    # Packed words above which the parallel kernel pays for its thread start-up
+    _PARALLEL_MIN_WORDS = 8192
+
+    @njit(cache=True, inline='always')
+    def _popcount64(x):
+        # LLVM lowers this pattern to a hardware POPCNT where available
+        x = x - ((x >> np.uint64(1)) & _M1)
+        x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+        x = (x + (x >> np.uint64(4))) & _M4
+        return np.int64((x * _H01) >> np.uint64(56))
+
+    @njit(cache=True, fastmath=True, boundscheck=False)
+    def _intersection_kernel(a, b):
+        total = 0
+        for i in range(a.size): # 64 pixels per step
+            total += _popcount64(a[i] & b[i])
+        return total
+
+    @njit(cache=True, parallel=True, fastmath=True, boundscheck=False)
+    def _intersection_kernel_parallel(a, b):
+        total = 0
+        for i in prange(a.size):
+            total += _popcount64(a[i] & b[i])
+        return total
+
+    def _packed_intersection(a, b):
+        """Number of pixels set in both packed masks (_packed_intersection(a, a) counts a's pixels)."""
+        a64 = a.view(np.uint64)
+        b64 = b.view(np.uint64)
+        if a64.size > _PARALLEL_MIN_WORDS:
+            return _intersection_kernel_parallel(a64, b64)
+        return _intersection_kernel(a64, b64)
+
+# Packed bits and pixel count of read-only masks, keyed by id() and dropped when the mask is
+# garbage-collected. A mask passed read-only is treated as unchanging; writeable masks are never cached
+_PACK_CACHE = {}
+_FLIPS_PACK_CACHE = {} # Same, for _pack_flips_with_count
+
+def _cached_for_mask(cache, mask, compute):
+    """compute(mask), memoized in cache for read-only masks."""
+    key = id(mask)
+    entry = cache.get(key)
+    if entry is not None and entry[0]() is mask:
+        return entry[1]
+    value = compute(mask)
+    if not mask.flags.writeable:
+        cache[key] = (weakref.ref(mask, lambda _, key=key: cache.pop(key, None)), value)
+    return value
+
+def _compute_pack_with_count(mask):
+    packed = _pack(mask)
+    return packed, _packed_intersection(packed, packed)
+
+def _pack_with_count(mask):
+    """Returns (packed mask, number of set pixels), reusing the cached packing of read-only masks."""
+    return _cached_for_mask(_PACK_CACHE, mask, _compute_pack_with_count)
+
+def _compute_pack_flips_with_count(mask):
+    flips = np.stack(_flips(mask)).reshape(len(FLIP_NAMES), -1)
+    packed = _pad_to_words(np.packbits(flips, axis=1))
+    return packed, _packed_intersection(packed[0], packed[0])
+
+def _pack_flips_with_count(mask):
+    """Returns ((4, words) packed flips of mask in FLIP_NAMES order, number of set pixels),
+    reusing the cached packing of read-only masks."""
+    return _cached_for_mask(_FLIPS_PACK_CACHE, mask, _compute_pack_flips_with_count)
+
+def _iou_from_counts(intersection, count1, count2):
+    union = count1 + count2 - intersection # |A u B| = |A| + |B| - |A n B|, so no OR pass is needed
+    if union == 0:
+        return 1.0 if intersection == 0 else 0.0 # 1.0 if both empty, 0 otherwise
+    return intersection / union
+
+def _flip_ious(ref_mask, comp_mask):
+    """IoU of ref_mask against each flip of comp_mask, in FLIP_NAMES order.
+    A flip applied to both masks preserves IoU, so IoU(ref, flip(comp)) == IoU(flip(ref), comp):
+    the reference's flips are packed once (and cached when it is read-only) and each comparison
+    mask is packed just once, unflipped."""
+    ref_flips_packed, ref_count = _pack_flips_with_count(ref_mask)
+    comp_packed, comp_count = _pack_with_count(comp_mask)
+    if njit is not None:
+        intersections = [_packed_intersection(row, comp_packed) for row in ref_flips_packed]
+    else:
+        intersections = _POPCNT8[np.bitwise_and(ref_flips_packed, comp_packed)].sum(axis=1, dtype=np.int64)
+    return [_iou_from_counts(i, ref_count, comp_count) for i in intersections]
+
 def calculate_iou(mask1, mask2):
     """Calculates Intersection over Union (IoU) for binary masks."""
     if mask1 is None or mask2 is None or mask1.shape != mask2.shape:
         return 0.0 # Return 0 if masks are invalid or incompatible
     try:
-        intersection = np.logical_and(mask1, mask2).sum()
-        union = np.logical_or(mask1, mask2).sum()
-        if union == 0:
-            return 1.0 if intersection == 0 else 0.0 # 1.0 if both empty, 0 otherwise
-        return intersection / union
+        # Popcounts over the packed masks touch 8x fewer bytes than boolean temporaries
+        a, count1 = _pack_with_count(mask1)
+        b, count2 = _pack_with_count(mask2)
+        return _iou_from_counts(_packed_intersection(a, b), count1, count2)
     except Exception as e:
         print(f"Error calculating IoU: {e}")
         return 0.0 # Return 0 on error
 
+def _directed_hausdorff(points1, points2):
+    """Directed Hausdorff distance from points1 to points2 (scipy's directed_hausdorff)."""
+    return directed_hausdorff(points1, points2)[0]
+
+def _symmetric_hausdorff(points1, points2):
+    """Symmetric Hausdorff distance, max of both directed distances."""
+    return max(_directed_hausdorff(points1, points2), _directed_hausdorff(points2, points1))
+
+if njit is not None:
+    _DBL_MAX = np.finfo(np.float64).max
+
+    @njit(cache=True, boundscheck=False)
+    def _hausdorff_scan(ax, ay, bx, by, order_a, order_b, cmax):
+        # Taha & Hanbury's early-exit scan, as in scipy: visiting points in a fixed random order,
+        # a point of a stops being scanned as soon as it is closer to b than the running maximum.
+        # Points come as separate contiguous x and y arrays. Returns max(cmax, squared distance a -> b)
+        for i in order_a:
+            cmin = _DBL_MAX
+            xi = ax[i]
+            yi = ay[i]
+            for j in order_b:
+                dx = xi - bx[j]
+                dy = yi - by[j]
+                d = dx * dx + dy * dy # Squared; one sqrt at the end
+                if d < cmax:
+                    cmin = d
+                    break
+                if d < cmin:
+                    cmin = d
+            if cmin > cmax:
+                cmax = cmin
+        return cmax
+
+    @njit(cache=True, nogil=True, boundscheck=False)
+    def _symmetric_hausdorff_kernel(ax, ay, bx, by):
+        np.random.seed(0)
+        order_a = np.random.permutation(ax.size)
+        order_b = np.random.permutation(bx.size)
+        # Starting the reverse scan at the forward distance only skips points that cannot raise the max
+        cmax = _hausdorff_scan(ax, ay, bx, by, order_a, order_b, 0.0)
+        return np.sqrt(_hausdorff_scan(bx, by, ax, ay, order_b, order_a, cmax))
+
+    def _split_xy(points):
+        """(N, 2) points as separate contiguous float64 x and y arrays."""
+        columns = np.ascontiguousarray(np.asarray(points, dtype=np.float64).T)
+        return columns[0], columns[1]
+
+    def _symmetric_hausdorff(points1, points2):
+        """Symmetric Hausdorff distance, both directions in one compiled call."""
+        return _symmetric_hausdorff_kernel(*_split_xy(points1), *_split_xy(points2))
+
 def calculate_hausdorff(contours1, contours2):
     """ Calculates directed Hausdorff distance between the largest contours. """
     if not contours1 or not contours2:
@@ -41,61 +222,104 @@ def calculate_hausdorff(contours1, contours2):
         if points1.shape[0] == 0 or points2.shape[0] == 0:
             return float('inf') # Cannot compare empty point sets
 
-        dist12 = directed_hausdorff(points1, points2)[0]
-        dist21 = directed_hausdorff(points2, points1)[0]
-        return max(dist12, dist21) # Use max for symmetric Hausdorff distance
+        return _symmetric_hausdorff(points1, points2) # Max of both directed distances
     except Exception as e:
         print(f"Error calculating Hausdorff distance: {e}")
         return float('inf') # Return infinity on error
 
 
-def compare_masks(ref_mask, comp_mask, iou_tolerance=0.01, hausdorff_tolerance=2.0):
+def _flip_contours(contours, width, height, flip_x, flip_y):
+    """Contours of a mask flipped about x and/or y, derived from the unflipped mask's contours
+    (findContours on the flipped mask traces the same pixels, mirrored)."""
+    if not contours or not (flip_x or flip_y):
+        return contours
+    points = contours[0].copy()
+    if flip_x: points[..., 0] = (width - 1) - points[..., 0]
+    if flip_y: points[..., 1] = (height - 1) - points[..., 1]
+    return [points]
+
+# Contour point pairs above which compare_masks computes the flips' Hausdorff distances on threads.
+# Below it the hand-off costs more than the distances; the kernels and scipy's scan
+# both release the GIL
+_THREAD_MIN_PAIRS = 1_000_000
+_transform_pool = None
+_transform_pool_lock = threading.Lock()
+
+def _get_transform_pool():
+    """Shared thread pool for per-flip work, created on first use."""
+    global _transform_pool
+    with _transform_pool_lock:
+        if _transform_pool is None:
+            _transform_pool = ThreadPoolExecutor(max_workers=len(FLIP_NAMES))
+    return _transform_pool
+
+def _use_transform_threads(ref_contours, comp_contours):
+    if not ref_contours or not comp_contours or (os.cpu_count() or 1) < 2:
+        return False
+    if _worker_args is not None:
+        return False # Pool workers already keep every core busy
+    return len(ref_contours[0]) * len(comp_contours[0]) > _THREAD_MIN_PAIRS
+
+def compare_masks(ref_mask, comp_mask, iou_tolerance=0.01, hausdorff_tolerance=2.0, ref_contours=None):
     """
     Compares two masks using IoU and Hausdorff, considering flips.
     Prioritizes 'Flipped Vertically' if its score is within tolerance of the best.
+    ref_contours, if given, must be find_contours_from_mask(ref_mask); callers comparing one
+    reference against many masks pass it so the reference is traced only once.
     """
     if ref_mask is None or comp_mask is None:
         return {"best_iou": 0.0, "best_hausdorff": float('inf'), "best_transform": "N/A"}
 
-    transformations = {
-        "Original": comp_mask,
-        "Flipped Horizontally": cv2.flip(comp_mask, 1),
-        "Flipped Vertically": cv2.flip(comp_mask, 0),
-        "Flipped Both": cv2.flip(comp_mask, -1),
-    }
+    # Find contours for the reference mask once (unless the caller already has them)
+    # Use the function imported from mask_utils
+    if ref_contours is None:
+        ref_contours = mask_utils.find_contours_from_mask(ref_mask)
+    # IoU for all four transforms at once
+    if comp_mask.shape == ref_mask.shape:
+        ious = _flip_ious(ref_mask, comp_mask)
+    else:
+        ious = [0.0] * len(FLIP_NAMES) # Incompatible masks, as in calculate_iou
 
-    abs_best_iou = -1.0
-    abs_best_iou_transform = "N/A"
-    abs_best_hausdorff = float('inf')
-    abs_best_hausdorff_transform = "N/A"
+    # Trace the comparison mask once; the flips' contours are the same points mirrored
+    comp_contours_orig = mask_utils.find_contours_from_mask(comp_mask)
+    height, width = comp_mask.shape[:2]
 
-    vert_flip_iou = None
-    vert_flip_hausdorff = None
+    # Flipped Vertically is chosen for both metrics whenever it is within tolerance of a perfect
+    # score (IoU 1, Hausdorff 0), whatever the other flips give, so their distances can be skipped
+    vert_hausdorff_early = None
+    vert_iou_early = ious[_VERT]
+    if 1.0 - vert_iou_early <= iou_tolerance:
+        vert_hausdorff_early = calculate_hausdorff(
+            ref_contours, _flip_contours(comp_contours_orig, width, height, *_FLIP_AXES[_VERT]))
+        if vert_hausdorff_early <= hausdorff_tolerance:
+            return {
+                "best_iou": vert_iou_early,
+                "best_iou_transform": "Flipped Vertically",
+                "best_hausdorff": vert_hausdorff_early,
+                "best_hausdorff_transform": "Flipped Vertically"
+            }
 
-    # Find contours for the reference mask once
-    # Use the function imported from mask_utils
-    ref_contours = mask_utils.find_contours_from_mask(ref_mask)
-
-    for name, transformed_mask in transformations.items():
-        # Calculate IoU
-        current_iou = calculate_iou(ref_mask, transformed_mask)
-        if current_iou > abs_best_iou:
-            abs_best_iou = current_iou
-            abs_best_iou_transform = name
-        # Store vertical flip result specifically
-        if name == "Flipped Vertically":
-            vert_flip_iou = current_iou
-
-        # Calculate Hausdorff
-        # Use the function imported from mask_utils
-        comp_contours = mask_utils.find_contours_from_mask(transformed_mask)
-        current_hausdorff = calculate_hausdorff(ref_contours, comp_contours)
-        if current_hausdorff < abs_best_hausdorff:
-            abs_best_hausdorff = current_hausdorff
-            abs_best_hausdorff_transform = name
-        # Store vertical flip result specifically
-        if name == "Flipped Vertically":
-            vert_flip_hausdorff = current_hausdorff
+    def flip_hausdorff(axes):
+        return calculate_hausdorff(ref_contours, _flip_contours(comp_contours_orig, width, height, *axes))
+
+    pending = [axes for k, axes in enumerate(_FLIP_AXES) if k != _VERT or vert_hausdorff_early is None]
+    if _use_transform_threads(ref_contours, comp_contours_orig):
+        computed = iter(list(_get_transform_pool().map(flip_hausdorff, pending)))
+    else:
+        computed = map(flip_hausdorff, pending)
+    hausdorffs = [vert_hausdorff_early if k == _VERT and vert_hausdorff_early is not None else next(computed)
+                  for k in range(len(FLIP_NAMES))]
+
+    # Best by index; argmax/argmin return the first of equal scores, as the sequential scan did
+    best_iou_index = int(np.argmax(ious))
+    abs_best_iou = ious[best_iou_index]
+    abs_best_iou_transform = FLIP_NAMES[best_iou_index]
+    best_hausdorff_index = int(np.argmin(hausdorffs))
+    abs_best_hausdorff = hausdorffs[best_hausdorff_index]
+    # All distances infinite (no usable contours): no transform is better than another
+    abs_best_hausdorff_transform = FLIP_NAMES[best_hausdorff_index] if abs_best_hausdorff != float('inf') else "N/A"
+    vert_flip_iou = ious[_VERT]
+    vert_flip_hausdorff = hausdorffs[_VERT]
 
     # --- Apply Prioritization Logic ---
     final_best_iou = abs_best_iou
@@ -121,4 +345,89 @@ def compare_masks(ref_mask, comp_mask, iou_tolerance=0.01, hausdorff_tolerance=2
         "best_iou_transform": final_best_iou_transform,
         "best_hausdorff": final_best_hausdorff,
         "best_hausdorff_transform": final_best_hausdorff_transform
-    }
\ No newline at end of file
+    }
+
+
+def _compare_dat_file(dat_path, ref_mask, target_size, iou_tolerance, hausdorff_tolerance, ref_contours=None,
+                      scratch=None):
+    """Loads one .dat mask (into scratch, if given) and compares it with ref_mask.
+    Returns None if the file can't be loaded."""
+    comparison_mask = mask_utils.load_dat_as_mask(dat_path, target_size=target_size, out=scratch)
+    if comparison_mask is None:
+        return None
+    return compare_masks(ref_mask, comparison_mask, iou_tolerance=iou_tolerance,
+                         hausdorff_tolerance=hausdorff_tolerance, ref_contours=ref_contours)
+
+def _iter_dat_masks(dat_paths, target_size, prefetch=16):
+    """Yields load_dat_as_mask(path) for each path in order, reading up to `prefetch` files ahead
+    on a thread pool so disk reads overlap with the caller's comparisons.
+    Masks are decoded into a ring of prefetch + 1 reused buffers, so each yielded mask is only
+    valid until the caller asks for the next one."""
+    # At most prefetch + 1 masks are alive at once: the pending reads plus the one the caller holds
+    buffers = np.empty((prefetch + 1, target_size[1], target_size[0]), dtype=np.uint8)
+    with ThreadPoolExecutor(max_workers=min(prefetch, 8)) as pool:
+        pending = deque()
+        for i, dat_path in enumerate(dat_paths):
+            pending.append(pool.submit(mask_utils.load_dat_as_mask, dat_path, target_size, buffers[i % (prefetch + 1)]))
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# Per-process state set by _init_dat_worker. The reference mask is read from shared memory,
+# so workers map the parent's buffer instead of each receiving a pickled copy
+_worker_args = None
+_worker_shm = None
+
+def _init_dat_worker(shm_name, shape, dtype, target_size, iou_tolerance, hausdorff_tolerance):
+    global _worker_args, _worker_shm
+    _worker_shm = shared_memory.SharedMemory(name=shm_name) # Kept referenced for the worker's lifetime
+    ref_mask = np.ndarray(shape, dtype=dtype, buffer=_worker_shm.buf)
+    ref_mask.flags.writeable = False
+    ref_contours = mask_utils.find_contours_from_mask(ref_mask) # Traced once per worker, not per file
+    scratch = np.empty((target_size[1], target_size[0]), dtype=np.uint8) # Every file is decoded into this buffer
+    _worker_args = (ref_mask, target_size, iou_tolerance, hausdorff_tolerance, ref_contours, scratch)
+
+def _compare_dat_file_in_worker(dat_path):
+    return _compare_dat_file(dat_path, *_worker_args)
+
+def compare_dat_files(ref_mask, dat_paths, target_size, iou_tolerance=0.01, hausdorff_tolerance=2.0,
+                      max_workers=1):
+    """
+    Compares every .dat file in dat_paths against ref_mask.
+    Returns a list of compare_masks results in the same order as dat_paths (None for unreadable files).
+    Runs in-process by default, with the .dat reads prefetched on threads. max_workers > 1 opts in
+    to a process pool; spawning costs about a second per worker, so it only pays off for inputs
+    far larger than a village's few hundred files. Workers are spawned rather than forked, so the
+    pool is safe to start from a process that already runs threads or has TensorFlow loaded.
+    """
+    dat_paths = list(dat_paths)
+    args = (ref_mask, target_size, iou_tolerance, hausdorff_tolerance)
+    workers = min(max_workers or 1, len(dat_paths))
+    if workers > 1:
+        shm = None
+        try:
+            ref_mask = np.ascontiguousarray(ref_mask)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, ref_mask.nbytes))
+            np.ndarray(ref_mask.shape, dtype=ref_mask.dtype, buffer=shm.buf)[...] = ref_mask
+            initargs = (shm.name, ref_mask.shape, ref_mask.dtype.str) + args[1:]
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_dat_worker, initargs=initargs) as executor:
+                # Chunks amortise the per-task IPC; ~4 chunks per worker keeps the load balanced
+                chunksize = max(1, len(dat_paths) // (workers * 4))
+                return list(executor.map(_compare_dat_file_in_worker, dat_paths, chunksize=chunksize))
+        except Exception as e:
+            print(f"Process pool unavailable ({e}); comparing serially.")
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+    ref_contours = None
+    if ref_mask is not None:
+        ref_contours = mask_utils.find_contours_from_mask(ref_mask)
+        ref_mask = ref_mask.view()
+        ref_mask.flags.writeable = False # Lets compare_masks reuse the reference's packed bits
+    return [None if comparison_mask is None else
+            compare_masks(ref_mask, comparison_mask, iou_tolerance=iou_tolerance, hausdorff_tolerance=hausdorff_tolerance,
+                          ref_contours=ref_contours)
+            for comparison_mask in _iter_dat_masks(dat_paths, target_size)]
@@ -1,6 +1,17 @@
 # geometry_utils.py
 import numpy as np
-import geopandas as gpd
+import shapely
+try:
+    from numba import njit
+except ImportError:
+    njit = None # Optional: normalize_coordinates falls back to NumPy
+
+def _coords_array(geom):
+    """ Coordinates of a single-part geometry as an (N, 2) or (N, 3) array, read directly from GEOS. """
+    if geom.geom_type.startswith('Multi') or geom.geom_type == 'GeometryCollection':
+        # Same failure as .coords on multi-part geometries
+        raise NotImplementedError("Multi-part geometries do not provide a coordinate sequence")
+    return shapely.get_coordinates(geom, include_z=geom.has_z)
 
 def get_coordinates_from_geometry(geometry):
     """ Extracts boundary coordinates from a given geometry object. """
@@ -11,14 +22,14 @@ def get_coordinates_from_geometry(geometry):
                  # print(f"Warning: Geometry boundary is empty or None for {type(geometry)}") # Optional verbose
                  # Try exterior coords if available
                  if hasattr(geometry, 'exterior') and geometry.exterior is not None:
-                     coords = np.array(geometry.exterior.coords)
+                     coords = _coords_array(geometry.exterior)
                      return coords if coords.size > 0 else None
                  else:
                      return None # Cannot get coords
-            coords = np.array(geometry.boundary.coords)
+            coords = _coords_array(geometry.boundary)
             return coords if coords.size > 0 else None
         elif hasattr(geometry, 'coords'): # Handle LineStrings etc.
-             coords = np.array(geometry.coords)
+             coords = _coords_array(geometry)
              return coords if coords.size > 0 else None
         else:
             print(f"Error: Unsupported geometry type or no coordinates found: {type(geometry)}")
@@ -27,26 +38,50 @@ def get_coordinates_from_geometry(geometry):
         print(f"Error extracting coordinates from geometry: {e}")
         return None
 
+if njit is not None:
+    @njit(cache=True)
+    def _normalize_kernel(columns):
+        """Takes one contiguous row per axis ((d, n), i.e. x[] and y[] apart rather than interleaved).
+        Per axis, one pass finds min/max and one writes (value - min) / range (0.5 for zero range).
+        Returns the usual (n, d) layout."""
+        d, n = columns.shape
+        normalized = np.empty((n, d))
+        for j in range(d):
+            values = columns[j]
+            min_val = values[0]
+            max_val = values[0]
+            for i in range(1, n):
+                v = values[i]
+                if v < min_val:
+                    min_val = v
+                elif v > max_val:
+                    max_val = v
+            range_val = max_val - min_val
+            for i in range(n):
+                normalized[i, j] = 0.5 if range_val == 0 else (values[i] - min_val) / range_val
+        return normalized
+
 def normalize_coordinates(coords):
     """ Normalizes coordinates to the range [0, 1]. """
     if coords is None or coords.shape[0] < 1: # Need at least one point
         # print("Error: Cannot normalize None or empty coordinates.") # Optional verbose
         return None
+    if coords.shape[0] == 1:
+        return np.array([[0.5, 0.5]], dtype=np.float32) # Single point -> center it
+    if njit is not None:
+        return _normalize_kernel(np.ascontiguousarray(np.asarray(coords, dtype=np.float64).T)).astype(np.float32)
     min_vals = coords.min(axis=0)
     max_vals = coords.max(axis=0)
     range_vals = max_vals - min_vals
     # Handle zero range (single point or straight line)
     range_vals[range_vals == 0] = 1 # Avoid division by zero, effectively sets normalized to 0 here
     normalized = (coords - min_vals) / range_vals
-    # Special handling for single point case -> center it
-    if coords.shape[0] == 1:
-        return np.array([[0.5, 0.5]])
     # If range was zero in one dim, ensure values are reasonable (e.g., center that dim)
     is_zero_range = (max_vals - min_vals) == 0
     if np.any(is_zero_range):
          normalized[:, is_zero_range] = 0.5 # Center dimensions with zero range
 
-    return normalized
+    return normalized.astype(np.float32)
 
 
 def pad_normalized_coordinates(norm_coords, padding_ratio):
@@ -57,7 +92,9 @@ def pad_normalized_coordinates(norm_coords, padding_ratio):
     scale_factor = 1.0 - (2 * padding_ratio) # Scale factor (less than 1)
     if scale_factor < 0: scale_factor = 0 # Avoid negative scaling
 
-    # Shift origin to center (0.5, 0.5), scale, then shift back
-    padded_coords = 0.5 + (norm_coords - 0.5) * scale_factor
-    padded_coords = np.clip(padded_coords, 0, 1) # Ensure stay within [0, 1]
+    # Shift origin to center (0.5, 0.5), scale, then shift back, all in one output buffer
+    padded_coords = np.subtract(norm_coords, 0.5, dtype=np.float32)
+    np.multiply(padded_coords, scale_factor, out=padded_coords)
+    np.add(padded_coords, 0.5, out=padded_coords)
+    np.clip(padded_coords, 0, 1, out=padded_coords) # Ensure stay within [0, 1]
     return padded_coords
\ No newline at end of file
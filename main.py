@@ -1,18 +1,18 @@
 # main_app.py
-import geopandas as gpd
-import matplotlib.pyplot as plt
+# geopandas, matplotlib and advanced_comparison (TensorFlow) are imported inside the functions
+# that use them, so the CLI starts quickly and the standard path never loads TensorFlow
+import importlib.util
 import os
+import sys
 import cv2 # Make sure cv2 is imported for reading map image dimensions
 import numpy as np
-import time
-import tempfile
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 # Import our utility modules
 import geometry_utils
 import mask_utils
 import comparison_utils
-import advanced_comparison
 
 # Import PDF generation module
 try:
@@ -22,21 +22,34 @@ except ImportError:
     print("WARNING: PDF generator module not found. PDF report generation disabled.")
     FPDF_AVAILABLE = False
 
+# 256-entry lookup table for the reference display image: mask value 1 -> black shape, anything else -> white
+_REF_DISPLAY_LUT = np.full(256, 255, dtype=np.uint8)
+_REF_DISPLAY_LUT[1] = 0
+
+# Encoded PNG bytes of each saved reference image, keyed by its path, so later consumers
+# (the PDF report) decode from memory instead of re-reading the file
+_REFERENCE_PNG_BYTES = {}
+
 # --- Main Helper Functions ---
 def get_available_villages():
     """Returns a list of available villages from the maps directory."""
     maps_dir = "maps"
     villages = []
     try:
-        for item in os.listdir(maps_dir):
-            village_path = os.path.join(maps_dir, item)
-            if os.path.isdir(village_path):
-                # Check if it has the required structure (dat_folder and panda folder)
-                dat_folder = os.path.join(village_path, "dat_folder")
-                panda_folders = [f for f in os.listdir(village_path) if f.endswith("_panda")]
-                
-                if os.path.exists(dat_folder) and panda_folders:
-                    villages.append(item)
+        with os.scandir(maps_dir) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                # Check if it has the required structure (dat_folder and panda folder) in one listing
+                has_dat_folder = has_panda_folder = False
+                with os.scandir(entry.path) as sub_entries:
+                    for sub_entry in sub_entries:
+                        if sub_entry.name == "dat_folder":
+                            has_dat_folder = True
+                        elif sub_entry.name.endswith("_panda"):
+                            has_panda_folder = True
+                if has_dat_folder and has_panda_folder:
+                    villages.append(entry.name)
     except Exception as e:
         print(f"Error scanning villages: {e}")
     
@@ -53,14 +66,15 @@ def get_village_structure(village_name):
     # Get all subdirectories in dat_folder
     sub_villages = []
     try:
-        for item in os.listdir(dat_folder):
-            item_path = os.path.join(dat_folder, item)
-            if os.path.isdir(item_path):
+        with os.scandir(dat_folder) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
                 # Check if it has dat and dat_image folders
-                dat_subfolder = os.path.join(item_path, "dat")
-                dat_image_subfolder = os.path.join(item_path, "dat_image")
-                if os.path.exists(dat_subfolder) and os.path.exists(dat_image_subfolder):
-                    sub_villages.append(item)
+                with os.scandir(entry.path) as sub_entries:
+                    names = {sub_entry.name for sub_entry in sub_entries}
+                if "dat" in names and "dat_image" in names:
+                    sub_villages.append(entry.name)
     except Exception as e:
         print(f"Error scanning sub-villages for {village_name}: {e}")
     
@@ -107,23 +121,18 @@ def setup_config():
     print(f"Found {len(sub_villages)} sub-villages: {', '.join(sub_villages)}")
     
     # Find the shapefile
-    panda_folder = None
     village_path = os.path.join("maps", selected_village)
-    for item in os.listdir(village_path):
-        if item.endswith("_panda"):
-            panda_folder = os.path.join(village_path, item)
-            break
+    with os.scandir(village_path) as entries:
+        # is_dir()/is_file() use the type cached from the directory read, so no extra stat per entry
+        panda_folder = next((e.path for e in entries if e.name.endswith("_panda") and e.is_dir()), None)
     
     if not panda_folder:
         print(f"No panda folder found for {selected_village}")
         return None
     
     # Find the shapefile in the panda folder
-    shapefile_path = None
-    for file in os.listdir(panda_folder):
-        if file.endswith(".shp"):
-            shapefile_path = os.path.join(panda_folder, file)
-            break
+    with os.scandir(panda_folder) as entries:
+        shapefile_path = next((e.path for e in entries if e.name.endswith(".shp") and e.is_file()), None)
     
     if not shapefile_path:
         print(f"No shapefile found in {panda_folder}")
@@ -151,6 +160,8 @@ def setup_config():
         "top_n_matches": 5,
         "iou_prioritization_tolerance": 0.01,
         "hausdorff_prioritization_tolerance": 2.0,
+        "show_plots": True, # False: write the comparison image with cv2 instead of opening a matplotlib window
+        "visualization_folder": "comparison_images",
     }
     
     # Basic validation
@@ -163,9 +174,13 @@ def setup_config():
 def get_user_selections(config):
     """Loads shapefile and gets user selections for index and method."""
     try:
-        data = gpd.read_file(config["shapefile_path"])
+        import pyogrio
+        # The feature count comes from the shapefile header; only the chosen feature is read later
+        num_geometries = pyogrio.read_info(config["shapefile_path"])["features"]
+        if num_geometries < 0: # Driver without a fast count
+            num_geometries = len(pyogrio.read_dataframe(config["shapefile_path"], columns=[], read_geometry=False,
+                                                        fid_as_index=True))
         print(f"Shapefile loaded: {config['shapefile_path']}")
-        num_geometries = len(data)
         if num_geometries == 0: raise ValueError("Shapefile is empty.")
         print(f"Found {num_geometries} features.")
     except Exception as e:
@@ -184,6 +199,14 @@ def get_user_selections(config):
         except EOFError: print("\nInput cancelled."); return None, None, None
     print(f"Using feature index {chosen_index} as reference.")
 
+    try:
+        # Random access to just this feature through the .shx index, geometry only; indexed by FID,
+        # so data.loc[chosen_index, 'geometry'] works as it did on the full GeoDataFrame
+        data = pyogrio.read_dataframe(config["shapefile_path"], fids=[chosen_index], columns=[], fid_as_index=True)
+    except Exception as e:
+        print(f"Error reading feature {chosen_index} from shapefile: {e}")
+        return None, None, None
+
     comparison_method = ''
     while True: # Loop for method input
         user_choice = input("Choose comparison method ('standard' or 'advanced'): ").lower().strip()
@@ -221,9 +244,14 @@ def generate_references(data, chosen_index, config):
             ref_img_filename = f"{shapefile_basename}_ref_idx{chosen_index}.png"
             reference_image_path = os.path.join(config["reference_image_folder"], ref_img_filename)
             try:
-                ref_img_display = np.ones((config["image_size"], config["image_size"]), dtype=np.uint8) * 255
-                ref_img_display[reference_mask == 1] = 0 # Black shape
-                cv2.imwrite(reference_image_path, ref_img_display)
+                ref_img_display = cv2.LUT(reference_mask.astype(np.uint8, copy=False), _REF_DISPLAY_LUT)
+                # Low zlib level: the image is a binary shape, so level 1 compresses nearly as well and much faster
+                ok, encoded = cv2.imencode(".png", ref_img_display, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+                if not ok: raise IOError("PNG encoding failed.")
+                ref_png_bytes = encoded.tobytes()
+                with open(reference_image_path, "wb") as f:
+                    f.write(ref_png_bytes)
+                _REFERENCE_PNG_BYTES[reference_image_path] = ref_png_bytes
                 print(f"Reference image saved to {reference_image_path}")
             except Exception as e:
                 print(f"Warning: Could not save reference image: {e}")
@@ -233,8 +261,28 @@ def generate_references(data, chosen_index, config):
         print(f"Error generating reference data for index {chosen_index}: {e}")
         return None, None
 
+def _list_files(folder, suffix):
+    """Returns (files, error) for the files in folder whose lowercased name ends with suffix,
+    where files is a list of (name, path) and error is the exception if the folder can't be read."""
+    # Lowercase only the last len(suffix) characters, not each whole name
+    n = len(suffix)
+    try:
+        with os.scandir(folder) as entries:
+            return [(e.name, e.path) for e in entries if e.name[-n:].lower() == suffix and e.is_file()], None
+    except Exception as e:
+        return None, e
+
+def _list_files_in_folders(folders, suffix, max_workers=8):
+    """_list_files for each folder, in order. Folders are listed on a thread pool so that
+    directory reads on slow or network disks overlap instead of running back to back."""
+    if len(folders) <= 1:
+        return [_list_files(folder, suffix) for folder in folders]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(folders))) as executor:
+        return list(executor.map(lambda folder: _list_files(folder, suffix), folders))
+
 def run_comparison(reference_mask, reference_image_path, comparison_method, config):
-    """Runs the chosen comparison method across all sub-villages and returns sorted results list and best match info."""
+    """Runs the chosen comparison method across all sub-villages and returns sorted results list and best match info.
+    The standard method's list holds only the top_n_matches results, the ones that are reported."""
     comparison_results_list = []
     best_match_found = False
     best_match_base_filename = None
@@ -244,40 +292,53 @@ def run_comparison(reference_mask, reference_image_path, comparison_method, conf
         print(f"\nPerforming standard comparison across all sub-villages in: {config['village_name']}")
         
         total_processed_files = 0
-        temp_results = []
+        processed = [] # (dat_filename, sub_village, compare_masks result) per compared file
         
-        # Iterate through all sub-villages
-        for sub_village in config['sub_villages']:
-            comparison_dat_folder = os.path.join(config['dat_folder_base'], sub_village, 'dat')
+        # Collect every .dat file across all sub-villages first, so one worker pool compares them all
+        subvillage_files = []
+        dat_folders = [os.path.join(config['dat_folder_base'], sub_village, 'dat') for sub_village in config['sub_villages']]
+        listings = _list_files_in_folders(dat_folders, '.dat')
+        for sub_village, comparison_dat_folder, (all_comparison_files, error) in zip(config['sub_villages'], dat_folders, listings):
             print(f"Processing sub-village: {sub_village}")
-            
-            try:
-                all_comparison_files = [f for f in os.listdir(comparison_dat_folder) if f.lower().endswith('.dat')]
-                if not all_comparison_files: 
-                    print(f"  No .dat files found in {comparison_dat_folder}")
-                    continue
-                print(f"  Found {len(all_comparison_files)} .dat files in {sub_village}")
-            except Exception as e: 
-                print(f"  Error accessing comparison folder {comparison_dat_folder}: {e}")
+            if error is not None: 
+                print(f"  Error accessing comparison folder {comparison_dat_folder}: {error}")
+                continue
+            if not all_comparison_files: 
+                print(f"  No .dat files found in {comparison_dat_folder}")
                 continue
+            print(f"  Found {len(all_comparison_files)} .dat files in {sub_village}")
+            subvillage_files.append((sub_village, all_comparison_files))
 
+        dat_paths = [dat_path for _, files in subvillage_files for _, dat_path in files]
+        all_results = iter(comparison_utils.compare_dat_files(
+            reference_mask, dat_paths, target_size=(config['image_size'], config['image_size']),
+            iou_tolerance=config['iou_prioritization_tolerance'],
+            hausdorff_tolerance=config['hausdorff_prioritization_tolerance']
+        ))
+
+        for sub_village, all_comparison_files in subvillage_files:
             processed_files_in_subvillage = 0
-            for dat_filename in all_comparison_files:
-                comparison_dat_path = os.path.join(comparison_dat_folder, dat_filename)
-                comparison_mask = mask_utils.load_dat_as_mask(comparison_dat_path, target_size=(config['image_size'], config['image_size']))
-                if comparison_mask is None: 
+            for dat_filename, _ in all_comparison_files:
+                result = next(all_results)
+                if result is None: 
                     print(f"  Skipping {dat_filename} due to loading error.")
                     continue
-                
-                result = comparison_utils.compare_masks(
-                    reference_mask, comparison_mask,
-                    iou_tolerance=config['iou_prioritization_tolerance'],
-                    hausdorff_tolerance=config['hausdorff_prioritization_tolerance']
-                )
                 processed_files_in_subvillage += 1
                 total_processed_files += 1
-                
-                temp_results.append({
+                processed.append((dat_filename, sub_village, result))
+            
+            print(f"  Processed {processed_files_in_subvillage} files in {sub_village}")
+        
+        print(f"Standard comparison processing completed for {total_processed_files} files across {len(config['sub_villages'])} sub-villages.")
+        
+        if processed:
+            # Scores are kept as columns; result dicts are only built for the top matches that get reported
+            ious = np.fromiter((p[2]["best_iou"] for p in processed), dtype=np.float64, count=len(processed))
+            hausdorffs = np.fromiter((p[2]["best_hausdorff"] for p in processed), dtype=np.float64, count=len(processed))
+            # Highest IoU first, ties broken by lowest Hausdorff (stable, so ties keep directory order)
+            for i in np.lexsort((hausdorffs, -ious))[:config['top_n_matches']]:
+                dat_filename, sub_village, result = processed[i]
+                comparison_results_list.append({
                     "filename": dat_filename, 
                     "sub_village": sub_village,
                     "iou": result["best_iou"], 
@@ -285,14 +346,6 @@ def run_comparison(reference_mask, reference_image_path, comparison_method, conf
                     "hausdorff": result["best_hausdorff"], 
                     "hausdorff_transform": result["best_hausdorff_transform"]
                 })
-            
-            print(f"  Processed {processed_files_in_subvillage} files in {sub_village}")
-        
-        print(f"Standard comparison processing completed for {total_processed_files} files across {len(config['sub_villages'])} sub-villages.")
-        
-        if temp_results:
-            temp_results.sort(key=lambda x: (x["iou"], -x["hausdorff"]), reverse=True)
-            comparison_results_list = temp_results # Assign sorted results
             best_match_found = True
             best_match_source_file = comparison_results_list[0]['filename']
             best_match_sub_village = comparison_results_list[0]['sub_village']
@@ -303,33 +356,31 @@ def run_comparison(reference_mask, reference_image_path, comparison_method, conf
 
     elif comparison_method == 'advanced':
         print(f"\nPerforming advanced comparison using VGG16 across all sub-villages...")
-        if reference_image_path is None or not os.path.exists(reference_image_path):
-             print(f"Error: Reference image needed for advanced comparison not found at '{reference_image_path}'.")
-             return [], False, None, "" # Cannot proceed
+        # Fail fast, before listing any image folders, if TensorFlow can't be loaded
+        try:
+            import advanced_comparison
+        except ImportError as e:
+            print(f"Error: Advanced comparison unavailable ({e}).")
+            return [], False, None, ""
 
         total_comparison_files = []
         
         # Collect all image files from all sub-villages
-        for sub_village in config['sub_villages']:
-            original_image_folder = os.path.join(config['dat_folder_base'], sub_village, 'dat_image')
+        image_folders = [os.path.join(config['dat_folder_base'], sub_village, 'dat_image') for sub_village in config['sub_villages']]
+        listings = _list_files_in_folders(image_folders, config['original_image_extension'])
+        for sub_village, original_image_folder, (comparison_image_files, error) in zip(config['sub_villages'], image_folders, listings):
             print(f"Processing sub-village: {sub_village}")
-            
-            try:
-                comparison_image_files = [os.path.join(original_image_folder, f)
-                                         for f in os.listdir(original_image_folder)
-                                         if f.lower().endswith(config['original_image_extension'])]
-                if not comparison_image_files:
-                    print(f"  No '{config['original_image_extension']}' files found in {original_image_folder}")
-                    continue
-                
-                print(f"  Found {len(comparison_image_files)} image files in {sub_village}")
-                # Add sub-village info to each file path for tracking
-                for img_path in comparison_image_files:
-                    total_comparison_files.append((img_path, sub_village))
-                    
-            except Exception as e: 
-                print(f"  Error accessing original image folder {original_image_folder}: {e}")
+            if error is not None: 
+                print(f"  Error accessing original image folder {original_image_folder}: {error}")
+                continue
+            if not comparison_image_files:
+                print(f"  No '{config['original_image_extension']}' files found in {original_image_folder}")
                 continue
+            
+            print(f"  Found {len(comparison_image_files)} image files in {sub_village}")
+            # Add sub-village info to each file path for tracking
+            for _, img_path in comparison_image_files:
+                total_comparison_files.append((img_path, sub_village))
 
         if not total_comparison_files:
             print("No image files found in any sub-village for advanced comparison.")
@@ -339,22 +390,22 @@ def run_comparison(reference_mask, reference_image_path, comparison_method, conf
         
         # Extract just the paths for VGG comparison
         image_paths_only = [item[0] for item in total_comparison_files]
-        advanced_results_tuples = advanced_comparison.run_vgg16_comparison(reference_image_path, image_paths_only)
+        path_to_sub_village = dict(total_comparison_files)
+        # Comparison-image embeddings are cached per village, so later runs only push the reference
+        # (and any new or changed images) through the model; the rest are batched in one pipeline
+        embeddings_cache_path = os.path.join("cache", f"vgg_embeddings_{config['village_name']}.npz")
+        # The reference is rendered in memory (same pixels as the saved PNG) rather than re-read from disk
+        ref_img_display = cv2.LUT(reference_mask.astype(np.uint8, copy=False), _REF_DISPLAY_LUT)
+        advanced_results_tuples = advanced_comparison.run_vgg16_comparison(
+            ref_img_display, image_paths_only, embeddings_cache_path=embeddings_cache_path)
 
         if advanced_results_tuples:
              # Convert to list of dicts and add sub-village info
              for img_path, similarity in advanced_results_tuples:
-                 # Find the corresponding sub-village for this image path
-                 sub_village_for_path = None
-                 for path, sub_village in total_comparison_files:
-                     if path == img_path:
-                         sub_village_for_path = sub_village
-                         break
-                 
                  comparison_results_list.append({
                      'img_path': img_path, 
                      'similarity': similarity,
-                     'sub_village': sub_village_for_path or 'unknown'
+                     'sub_village': path_to_sub_village.get(img_path) or 'unknown'
                  })
              
              # Results already sorted by run_vgg16_comparison
@@ -368,12 +419,82 @@ def run_comparison(reference_mask, reference_image_path, comparison_method, conf
 
     return comparison_results_list, best_match_found, best_match_base_filename, best_match_score_info
 
+def _find_plot_image(village_name, sub_village, base_filename, extensions, folder_listings):
+    """Returns the first existing plot image for base_filename in a sub-village's plot folders, or None.
+    Each folder is listed once into folder_listings, so candidates are set lookups instead of stat calls."""
+    plots_dir = os.path.join("maps", village_name, "plots", sub_village)
+    # Folder paths are joined once per sub-village rather than once per extension
+    folders = [os.path.join(plots_dir, folder_name) if folder_name else plots_dir
+               for folder_name in ('contours', 'contour', '', 'enhanced')]
+    for extension in extensions:
+        filename = f"{base_filename}{extension}"
+        for folder in folders:
+            entries = folder_listings.get(folder)
+            if entries is None:
+                try:
+                    entries = set(os.listdir(folder))
+                except OSError:
+                    entries = set()
+                folder_listings[folder] = entries
+            if filename in entries:
+                return os.path.join(folder, filename)
+    return None
+
+# cv2.imread flags that let libjpeg decode at 1/2, 1/4 or 1/8 scale in the DCT domain
+_REDUCED_READ_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+def _read_image_for_display(image_path, max_display_side=600):
+    """Reads an image as BGR, decoded at the largest reduction that still leaves max_display_side pixels
+    (a subplot of the 12x6 inch figure is about 600 px), so large map JPEGs aren't decoded at full size."""
+    try:
+        from PIL import Image
+        with Image.open(image_path) as img: # Only parses the header
+            longest_side = max(img.size)
+        for factor, flag in _REDUCED_READ_FLAGS:
+            if longest_side // factor >= max_display_side:
+                return cv2.imread(image_path, flag)
+    except Exception:
+        pass # Unknown size: decode at full resolution
+    return cv2.imread(image_path)
+
+_TITLE_LINE_HEIGHT = 20
+
+def _titled_panel(image_bgr, title_lines, height, header_lines):
+    """Scales image_bgr to the given height and puts title_lines in a white header above it."""
+    h, w = image_bgr.shape[:2]
+    panel = cv2.resize(image_bgr, (max(1, round(w * height / h)), height), interpolation=cv2.INTER_AREA)
+    header = np.full((_TITLE_LINE_HEIGHT * header_lines + 10, panel.shape[1], 3), 255, dtype=np.uint8)
+    for i, line in enumerate(title_lines):
+        cv2.putText(header, line, (5, _TITLE_LINE_HEIGHT * (i + 1)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
+    return cv2.vconcat([header, panel])
+
+def _save_comparison_image(output_path, reference_mask, ref_title, plot_image, plot_title):
+    """Writes the reference mask and plot image side by side with cv2 (no matplotlib).
+    plot_image may be None, in which case a grey placeholder is drawn. Returns True on success."""
+    try:
+        height = reference_mask.shape[0]
+        ref_bgr = cv2.cvtColor(reference_mask.astype(np.uint8, copy=False) * np.uint8(255), cv2.COLOR_GRAY2BGR)
+        if plot_image is None:
+            plot_image = np.full((height, height, 3), 200, dtype=np.uint8)
+        ref_lines, plot_lines = ref_title.split("\n"), plot_title.split("\n")
+        header_lines = max(len(ref_lines), len(plot_lines))
+        combined = cv2.hconcat([_titled_panel(ref_bgr, ref_lines, height, header_lines),
+                                _titled_panel(plot_image, plot_lines, height, header_lines)])
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        return cv2.imwrite(output_path, combined)
+    except Exception as e:
+        print(f"Error saving comparison image: {e}")
+        return False
+
 def report_and_visualize(config, chosen_index, reference_mask, comparison_method, results_list,
                           best_match_found, best_match_base_filename, best_match_score_info):
-    """Handles console reporting and matplotlib visualization."""
+    """Handles console reporting and matplotlib visualization.
+    With config["show_plots"] False the comparison is saved as an image instead, without importing matplotlib."""
+    show_plots = config.get("show_plots", True)
     if not best_match_found or not results_list:
         print("\nNo comparison results to report or visualize.")
-        if reference_mask is not None:
+        if reference_mask is not None and show_plots:
+             import matplotlib.pyplot as plt
              plt.figure(figsize=(6, 6)); plt.imshow(reference_mask, cmap='gray'); plt.title(f"Reference Mask (Index {chosen_index})\nNo Match Found"); plt.axis('off');
              print("Displaying reference mask plot. Close the plot window to continue...")
              plt.show()
@@ -395,58 +516,43 @@ def report_and_visualize(config, chosen_index, reference_mask, comparison_method
     # Find the best match plot image path by determining which sub-village it belongs to
     best_match_sub_village = results_list[0].get('sub_village', 'unknown')
     # Look for the plot image in the corresponding plots sub-folder
-    plot_image_path = None
-    
     # Try multiple extensions (similar to PDF generation logic)
     extensions_to_try = ['.png', '.jpg', '.jpeg', config['plots_image_extension']]
     # Remove duplicates while preserving order
     extensions_to_try = list(dict.fromkeys(extensions_to_try))
     
-    # First try the specific sub-village folder
-    for extension in extensions_to_try:
-        potential_plots_paths = [
-            os.path.join("maps", config['village_name'], "plots", best_match_sub_village, "contours", f"{best_match_base_filename}{extension}"),
-            os.path.join("maps", config['village_name'], "plots", best_match_sub_village, "contour", f"{best_match_base_filename}{extension}"),
-            os.path.join("maps", config['village_name'], "plots", best_match_sub_village, f"{best_match_base_filename}{extension}"),
-            os.path.join("maps", config['village_name'], "plots", best_match_sub_village, "enhanced", f"{best_match_base_filename}{extension}")
-        ]
-        
-        for potential_path in potential_plots_paths:
-            if os.path.exists(potential_path):
-                plot_image_path = potential_path
-                break
-        
-        if plot_image_path:
-            break
-    
-    # Fallback: search all sub-village plot folders if not found in the specific one
+    # First try the specific sub-village folder, then fall back to searching all sub-village plot folders
+    folder_listings = {}
+    plot_image_path = _find_plot_image(config['village_name'], best_match_sub_village, best_match_base_filename,
+                                       extensions_to_try, folder_listings)
     if plot_image_path is None:
         for sub_village in config['sub_villages']:
-            for extension in extensions_to_try:
-                for folder_name in ['contours', 'contour', '', 'enhanced']:
-                    if folder_name:
-                        potential_path = os.path.join("maps", config['village_name'], "plots", sub_village, folder_name, f"{best_match_base_filename}{extension}")
-                    else:
-                        potential_path = os.path.join("maps", config['village_name'], "plots", sub_village, f"{best_match_base_filename}{extension}")
-                    
-                    if os.path.exists(potential_path):
-                        plot_image_path = potential_path
-                        break
-                
-                if plot_image_path:
-                    break
-            
+            plot_image_path = _find_plot_image(config['village_name'], sub_village, best_match_base_filename,
+                                               extensions_to_try, folder_listings)
             if plot_image_path:
                 break
 
     print(f"\nVisualizing reference mask vs. plot image: {plot_image_path if plot_image_path else 'Not found'}")
-    
+
+    if not show_plots:
+        plot_image = _read_image_for_display(plot_image_path, reference_mask.shape[0]) if plot_image_path else None
+        if plot_image is not None:
+            plot_title = f"Best Match Plot: {best_match_base_filename}{config['plots_image_extension']}\nSub-village: {best_match_sub_village}\n({best_match_score_info})"
+        else:
+            plot_title = f"Plot Image Missing\n{best_match_base_filename}{config['plots_image_extension']}\nSub-village: {best_match_sub_village}"
+        output_path = os.path.join(config.get("visualization_folder", "comparison_images"),
+                                   f"comparison_{config['village_name']}_idx{chosen_index}_{comparison_method}.png")
+        if _save_comparison_image(output_path, reference_mask, f"Reference Mask (Index {chosen_index})", plot_image, plot_title):
+            print(f"Comparison image saved to {output_path}")
+        return
+
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(12, 6))
     plt.subplot(1, 2, 1); plt.imshow(reference_mask, cmap='gray'); plt.title(f"Reference Mask (Index {chosen_index})"); plt.axis('off')
     plt.subplot(1, 2, 2)
     
     if plot_image_path and os.path.exists(plot_image_path):
-        plot_image = cv2.imread(plot_image_path)
+        plot_image = _read_image_for_display(plot_image_path)
         if plot_image is not None:
             plt.imshow(cv2.cvtColor(plot_image, cv2.COLOR_BGR2RGB))
             plt.title(f"Best Match Plot: {best_match_base_filename}{config['plots_image_extension']}\nSub-village: {best_match_sub_village}\n({best_match_score_info})")
@@ -466,6 +572,7 @@ def report_and_visualize(config, chosen_index, reference_mask, comparison_method
 
 def cleanup_reference_image(config, reference_image_path):
     """Deletes the saved reference image if applicable."""
+    _REFERENCE_PNG_BYTES.pop(reference_image_path, None)
     if config.get('save_reference_image', False) and reference_image_path is not None: # Use .get for safety
         # print(f"\nCleaning up reference image: {reference_image_path}") # Optional Verbose
         try:
@@ -478,9 +585,12 @@ def cleanup_reference_image(config, reference_image_path):
 
 
 # --- New Main Orchestration Function ---
-def run_main_workflow():
-    """Orchestrates the main application workflow."""
+def run_main_workflow(show_plots=True):
+    """Orchestrates the main application workflow.
+    show_plots=False saves the comparison image instead of opening a matplotlib window."""
     config = setup_config()
+    if config is None: return
+    config["show_plots"] = show_plots
     reference_image_path_for_cleanup = None # Keep track of path for final cleanup
 
     try:
@@ -503,10 +613,11 @@ def run_main_workflow():
         if best_match_found and results_list:
              # Find the best match sub-village and set up plots folder
              best_match_sub_village = results_list[0].get('sub_village', 'unknown')
+             best_match_plots_dir = os.path.join("maps", config['village_name'], "plots", best_match_sub_village)
              potential_plots_folders = [
-                 os.path.join("maps", config['village_name'], "plots", best_match_sub_village, "contours"),
-                 os.path.join("maps", config['village_name'], "plots", best_match_sub_village),
-                 os.path.join("maps", config['village_name'], "plots", best_match_sub_village, "enhanced")
+                 os.path.join(best_match_plots_dir, "contours"),
+                 best_match_plots_dir,
+                 os.path.join(best_match_plots_dir, "enhanced")
              ]
              
              plots_folder_for_pdf = None
@@ -516,7 +627,7 @@ def run_main_workflow():
                      break
              
              if plots_folder_for_pdf is None:
-                 plots_folder_for_pdf = os.path.join("maps", config['village_name'], "plots", best_match_sub_village)
+                 plots_folder_for_pdf = best_match_plots_dir
              
              # Create pdf_reports folder if it doesn't exist
              pdf_reports_folder = "pdf_reports"
@@ -532,6 +643,7 @@ def run_main_workflow():
                  chosen_index=chosen_index,
                  full_map_image_path=config.get("full_map_image_path"), # Use .get for optional keys
                  reference_image_path=reference_image_path, # Pass generated ref img path
+                 reference_image_bytes=_REFERENCE_PNG_BYTES.get(reference_image_path),
                  best_match_found=best_match_found,
                  best_match_base_filename=best_match_base_filename,
                  best_match_score_info=best_match_score_info,
@@ -561,12 +673,14 @@ def run_main_workflow():
 if __name__ == "__main__":
     # Check for optional dependencies
     tf_available = False; pillow_available = False; fpdf_available = FPDF_AVAILABLE
-    try: import tensorflow; tf_available = True
-    except ImportError: print("WARNING: TensorFlow not found.")
-    try: from PIL import Image; pillow_available = True
-    except ImportError: print("WARNING: Pillow not found.")
+    # find_spec only locates the packages, without paying TensorFlow's import cost up front
+    if importlib.util.find_spec("tensorflow") is not None: tf_available = True
+    else: print("WARNING: TensorFlow not found.")
+    if importlib.util.find_spec("PIL") is not None: pillow_available = True
+    else: print("WARNING: Pillow not found.")
 
     if not (tf_available and pillow_available): print("--- Advanced comparison disabled due to missing libraries. ---")
     if not fpdf_available: print("--- PDF report generation disabled due to missing FPDF2 library. ---")
 
-    run_main_workflow() # Call the new orchestrator function
\ No newline at end of file
+    # --no-gui: save the comparison image with cv2 instead of showing a blocking matplotlib window
+    run_main_workflow(show_plots="--no-gui" not in sys.argv[1:]) # Call the new orchestrator function
\ No newline at end of file
@@ -2,22 +2,25 @@
 import numpy as np
 import cv2
 import os
-import imutils # Required by find_contours_from_mask
+import threading
+
+def _scale_coords(coords, image_size):
+    """Normalized coords -> int32 pixel coords (truncated, like astype) in one pass and one allocation."""
+    coords_int = np.empty(np.shape(coords), dtype=np.int32)
+    np.multiply(coords, image_size - 1, out=coords_int, casting='unsafe')
+    return coords_int
 
 def create_mask_from_coords(coords, image_size, make_copy=True):
-    """ Creates a binary mask (0s and 1s) from normalized & padded coordinates. """
+    """ Creates a binary mask (0s and 1s) from normalized & padded coordinates.
+    `make_copy` is deprecated and ignored: the scaled coords are always a fresh array and fillPoly
+    doesn't modify them. """
     if coords is None or len(coords) < 3:
         # print("Warning: Need at least 3 coordinates to create a filled mask.") # Optional verbose
         # Return an empty mask
         return np.zeros((image_size, image_size), dtype=np.uint8)
 
     # Scale coordinates to image size BEFORE converting to int
-    scaled_coords = (coords * (image_size - 1))
-
-    if make_copy:
-        coords_int = scaled_coords.astype(np.int32).copy() # Ensure copy to avoid modifying original
-    else:
-        coords_int = scaled_coords.astype(np.int32)
+    coords_int = _scale_coords(coords, image_size)
 
     mask = np.zeros((image_size, image_size), dtype=np.uint8)
     # OpenCV expects a list of polygons
@@ -29,19 +32,69 @@ def create_mask_from_coords(coords, image_size, make_copy=True):
         return np.zeros((image_size, image_size), dtype=np.uint8) # Return empty on error
     return mask
 
-def load_dat_as_mask(filename, target_size=(500, 500)):
-    """Loads a .dat file, assumes it's a binary mask (0/1), and ensures target size."""
+def _packed_cache_path(filename, target_size):
+    return f"{filename}.{target_size[0]}x{target_size[1]}.packed.npy"
+
+def _read_packed_cache(filename, target_size):
+    """Returns the cached mask for (filename, target_size) unpacked to uint8, or None if there is
+    no cache file or it is older than the .dat file."""
+    cache_path = _packed_cache_path(filename, target_size)
+    try:
+        if os.stat(cache_path).st_mtime < os.stat(filename).st_mtime:
+            return None
+        packed = np.load(cache_path, mmap_mode='r', allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    # A .dat already at target_size keeps its own (rows, cols) = target_size; a resized one is
+    # (target_size[1], target_size[0]) as cv2.resize takes (width, height). The row count tells them apart
+    width = target_size[1] if packed.shape[0] == target_size[0] else target_size[0]
+    return np.unpackbits(packed, axis=1, count=width)
+
+def _write_packed_cache(filename, target_size, mask):
+    """Saves mask bit-packed next to the .dat file; silently skipped if the folder isn't writable."""
+    cache_path = _packed_cache_path(filename, target_size)
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+    try:
+        np.save(tmp_path, np.packbits(mask, axis=1))
+        os.replace(tmp_path, cache_path) # Readers never see a partly written file
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def load_dat_as_mask(filename, target_size=(500, 500), out=None):
+    """Loads a .dat file, assumes it's a binary mask (0/1), and ensures target size.
+    If `out` is a uint8 array of the mask's shape the result is written into it (and returned),
+    so callers looping over many files can reuse one buffer instead of allocating a mask per file.
+    The first load of each file also writes a bit-packed `<file>.<W>x<H>.packed.npy` next to it, which
+    later loads memory-map instead of re-parsing the text."""
+    cached = _read_packed_cache(filename, target_size)
+    if cached is not None:
+        if out is not None and out.shape == cached.shape and out.dtype == np.uint8:
+            np.copyto(out, cached)
+            return out
+        return cached
     try:
         data = np.loadtxt(filename, dtype=np.uint8) # Load directly as uint8
+        use_out = out is not None and out.dtype == np.uint8
         # Check if resizing is needed
         if data.shape != target_size:
             # print(f"Resizing {filename} from {data.shape} to {target_size}") # Optional verbose
-            resized_data = cv2.resize(data, target_size, interpolation=cv2.INTER_NEAREST)
+            if use_out and out.shape == (target_size[1], target_size[0]):
+                # Resize straight into the caller's buffer, then binarize it in place
+                resized_data = cv2.resize(data, target_size, dst=out, interpolation=cv2.INTER_NEAREST)
+            else:
+                resized_data = cv2.resize(data, target_size, interpolation=cv2.INTER_NEAREST)
         else:
             resized_data = data
         # Ensure it's binary 0 or 1
-        resized_data = (resized_data > 0).astype(np.uint8)
-        return resized_data
+        if use_out and out.shape == resized_data.shape:
+            mask = np.greater(resized_data, 0, out=out)
+        else:
+            mask = (resized_data > 0).astype(np.uint8)
+        _write_packed_cache(filename, target_size, mask)
+        return mask
     except Exception as e:
         print(f"Error loading or processing data from {filename}: {e}")
         return None
@@ -51,16 +104,13 @@ def find_contours_from_mask(mask):
     if mask is None or not np.any(mask): # If mask is empty or all zeros
          return [] # Return empty list if no contours can be found
     try:
-        mask_uint8 = mask.astype(np.uint8)
-        cnts = cv2.findContours(mask_uint8, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        contours = imutils.grab_contours(cnts)
-        # Convert to list if it's a tuple to ensure we can sort
-        if isinstance(contours, tuple):
-            contours = list(contours)
-        # Sort contours by area descending, keep only the largest one for Hausdorff
+        # findContours leaves its input untouched (OpenCV >= 3.2), so a contiguous uint8 mask is used as is
+        mask_uint8 = np.ascontiguousarray(mask, dtype=np.uint8)
+        contours, _ = cv2.findContours(mask_uint8, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE) # OpenCV 4.x returns (contours, hierarchy)
+        # Keep only the largest contour for Hausdorff; argmax picks the first on ties, as the stable sort did
         if contours:
-             contours.sort(key=cv2.contourArea, reverse=True)
-             return [contours[0]] # Return list containing only the largest contour
+             areas = [cv2.contourArea(c) for c in contours]
+             return [contours[int(np.argmax(areas))]] # Return list containing only the largest contour
         else:
              return []
     except Exception as e:
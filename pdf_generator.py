@@ -7,13 +7,16 @@ It creates comprehensive reports with images, comparison data, and formatted lay
 
 import os
 import cv2
-import tempfile
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from typing import List, Dict, Optional, Any
 
 # Import PDF library (with check)
 try:
     from fpdf import FPDF
+    from fpdf.enums import MethodReturnValue
     FPDF_AVAILABLE = True
 except ImportError:
     print("WARNING: FPDF2 library not found (pip install fpdf2). PDF report generation disabled.")
@@ -26,6 +29,12 @@ PDF_IMAGE_WIDTH_FULL = PDF_PAGE_WIDTH  # Width for full-width images like the ma
 PDF_IMAGE_WIDTH_SIDE_BY_SIDE = PDF_PAGE_WIDTH / 2 - 5  # Width for side-by-side images
 PDF_THUMBNAIL_WIDTH = PDF_PAGE_WIDTH / 4  # Width for top match thumbnails
 PDF_LINE_HEIGHT = 6  # Line height for text
+PDF_HALF_WIDTH = PDF_PAGE_WIDTH / 2  # Width of each side-by-side column
+PDF_RIGHT_COLUMN_X = PDF_MARGIN + PDF_HALF_WIDTH + 5  # Left edge of the right-hand column
+PDF_DETAIL_LINE_HEIGHT = PDF_LINE_HEIGHT / 1.5  # Line height for match detail text
+# Longest side, in pixels, of the downscaled copies embedded for plot images (~160 dpi at their size on the page)
+PDF_THUMBNAIL_MAX_SIDE_PX = 300
+PDF_PLOT_IMAGE_MAX_SIDE_PX = 600
 
 
 class PDFReport(FPDF):
@@ -48,7 +57,8 @@ def create_pdf_report(pdf_filename: str, chosen_index: int,
                      best_match_found: bool, best_match_base_filename: Optional[str],
                      best_match_score_info: str, comparison_method: str,
                      top_results_list: List[Dict[str, Any]], plots_folder: str, 
-                     plots_image_extension: str, top_n_matches: int, village_name: str) -> None:
+                     plots_image_extension: str, top_n_matches: int, village_name: str,
+                     reference_image_bytes: Optional[bytes] = None) -> None:
     """
     Generates a PDF report summarizing the comparison findings.
     Includes dynamically sized full map, flipped reference image, and improved layout.
@@ -67,6 +77,8 @@ def create_pdf_report(pdf_filename: str, chosen_index: int,
         plots_image_extension: File extension for plot images
         top_n_matches: Number of top matches to include
         village_name: Name of the village
+        reference_image_bytes: Encoded reference PNG already in memory; decoded instead of
+            reading reference_image_path from disk
     """
     if not FPDF_AVAILABLE:
         print("Cannot generate PDF report because FPDF2 library is not installed.")
@@ -86,7 +98,7 @@ def create_pdf_report(pdf_filename: str, chosen_index: int,
     _add_best_match_overview(pdf, best_match_found, best_match_base_filename, 
                            best_match_score_info, top_results_list, plots_folder,
                            plots_image_extension, village_name, chosen_index, 
-                           reference_image_path)
+                           reference_image_path, reference_image_bytes)
     
     # Add Top Matches Details Section
     _add_top_matches_details(pdf, top_results_list, top_n_matches, comparison_method,
@@ -96,17 +108,36 @@ def create_pdf_report(pdf_filename: str, chosen_index: int,
     _save_pdf(pdf, pdf_filename)
 
 
+@functools.lru_cache(maxsize=32)
+def _get_image_dims(image_path: str, mtime: float) -> Optional[tuple]:
+    """(width, height) of an image as cv2.imread would decode it, read from the file header.
+    Cached per path and modification time, so reports sharing one map image only parse it once."""
+    try:
+        from PIL import Image
+        with Image.open(image_path) as img:  # Only parses the header
+            width, height = img.size
+            # cv2.imread applies the EXIF orientation; tags 5-8 rotate the image by 90 degrees
+            if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+                width, height = height, width
+        return width, height
+    except ImportError:
+        img = cv2.imread(image_path)  # No Pillow: fall back to a full decode
+        return None if img is None else (img.shape[1], img.shape[0])
+    except Exception:
+        return None
+
+
 def _add_map_image(pdf: PDFReport, full_map_image_path: Optional[str]) -> None:
     """Add the full map image to the PDF with dynamic scaling."""
     if full_map_image_path and os.path.exists(full_map_image_path):
         pdf.set_font('Helvetica', 'B', 12)
         pdf.cell(0, 8, "Overview Map", new_x="LMARGIN", new_y="NEXT", align='C')
         try:
-            # Get original image dimensions using OpenCV
-            img = cv2.imread(full_map_image_path)
-            if img is None:
+            # Get original image dimensions from the file header
+            dims = _get_image_dims(full_map_image_path, os.path.getmtime(full_map_image_path))
+            if dims is None:
                 raise ValueError(f"Could not read map image file: {full_map_image_path}")
-            orig_h, orig_w = img.shape[:2]
+            orig_w, orig_h = dims
             if orig_w == 0 or orig_h == 0:
                 raise ValueError("Map image has zero width or height.")
             aspect_ratio = orig_h / orig_w
@@ -162,119 +193,128 @@ def _add_best_match_overview(pdf: PDFReport, best_match_found: bool,
                            best_match_base_filename: Optional[str],
                            best_match_score_info: str, top_results_list: List[Dict[str, Any]],
                            plots_folder: str, plots_image_extension: str, village_name: str,
-                           chosen_index: int, reference_image_path: Optional[str]) -> None:
+                           chosen_index: int, reference_image_path: Optional[str],
+                           reference_image_bytes: Optional[bytes] = None) -> None:
     """Add the best match overview section with side-by-side images."""
     pdf.set_font('Helvetica', 'B', 12)
     pdf.cell(0, 10, "Best Match Overview", new_x="LMARGIN", new_y="NEXT")
     pdf.set_font('Helvetica', '', 10)
     
-    temp_ref_image_path = None  # To store path of temporary flipped image
-    
-    try:  # Use try...finally to ensure temp file deletion
-        if best_match_found and best_match_base_filename:
-            # Get the best match sub-village from the top results
-            best_match_sub_village = top_results_list[0].get('sub_village', 'unknown') if top_results_list else 'unknown'
-            
-            best_plot_image_path = _find_plot_image_path(best_match_base_filename, plots_image_extension,
-                                                       village_name, best_match_sub_village, plots_folder)
-            
-            # Store current Y position to align images and text
-            start_y_side = pdf.get_y()
-            max_image_height = 70  # Max height for these images
-
-            # Add labels for the side-by-side images
-            pdf.cell(PDF_PAGE_WIDTH / 2, PDF_LINE_HEIGHT, 
-                    f"Reference Feature (Index {chosen_index}, Vertically Flipped)", 
-                    new_x="RIGHT", new_y="TOP")
-            pdf.set_x(PDF_MARGIN + PDF_PAGE_WIDTH / 2 + 5)
-            pdf.cell(PDF_PAGE_WIDTH / 2, PDF_LINE_HEIGHT, 
-                    f"Best Matching Plot ({best_match_score_info})", 
-                    new_x="LMARGIN", new_y="NEXT")
-
-            image_y = pdf.get_y()
-            ref_img_x = PDF_MARGIN
-
-            # Load, Flip, Save Temp, and Draw Reference Image (Left)
-            temp_ref_image_path = _add_flipped_reference_image(pdf, reference_image_path, 
-                                                             ref_img_x, image_y, max_image_height)
-            
-            # Draw Best Match Plot Image (Right)
-            plot_img_x = PDF_MARGIN + PDF_PAGE_WIDTH / 2 + 5
-            _add_plot_image(pdf, best_plot_image_path, plot_img_x, image_y, max_image_height)
-
-            pdf.set_y(image_y + max_image_height + 5)  # Move below the images
+    if best_match_found and best_match_base_filename:
+        # Get the best match sub-village from the top results
+        best_match_sub_village = top_results_list[0].get('sub_village', 'unknown') if top_results_list else 'unknown'
+        
+        best_plot_image_path = _find_plot_image_path(best_match_base_filename, plots_image_extension,
+                                                   village_name, best_match_sub_village, plots_folder)
+        
+        # Store current Y position to align images and text
+        start_y_side = pdf.get_y()
+        max_image_height = 70  # Max height for these images
+
+        # Add labels for the side-by-side images
+        pdf.cell(PDF_HALF_WIDTH, PDF_LINE_HEIGHT, 
+                f"Reference Feature (Index {chosen_index}, Vertically Flipped)", 
+                new_x="RIGHT", new_y="TOP")
+        pdf.set_x(PDF_RIGHT_COLUMN_X)
+        pdf.cell(PDF_HALF_WIDTH, PDF_LINE_HEIGHT, 
+                f"Best Matching Plot ({best_match_score_info})", 
+                new_x="LMARGIN", new_y="NEXT")
+
+        image_y = pdf.get_y()
+        ref_img_x = PDF_MARGIN
+
+        # Load, Flip, and Draw Reference Image (Left)
+        _add_flipped_reference_image(pdf, reference_image_path, ref_img_x, image_y, max_image_height,
+                                     reference_image_bytes)
+        
+        # Draw Best Match Plot Image (Right)
+        plot_img_x = PDF_RIGHT_COLUMN_X
+        _add_plot_image(pdf, best_plot_image_path, plot_img_x, image_y, max_image_height)
 
-        else:
-            pdf.cell(0, 10, "No best match found during comparison.", new_x="LMARGIN", new_y="NEXT")
+        pdf.set_y(image_y + max_image_height + 5)  # Move below the images
+
+    else:
+        pdf.cell(0, 10, "No best match found during comparison.", new_x="LMARGIN", new_y="NEXT")
 
-        pdf.ln(5)  # Reduced spacing
+    pdf.ln(5)  # Reduced spacing
 
-    finally:
-        # Cleanup Temporary Flipped Reference Image
-        if temp_ref_image_path and os.path.exists(temp_ref_image_path):
-            try:
-                os.remove(temp_ref_image_path)
-            except Exception as e:
-                print(f"Warning: Could not delete temporary file {temp_ref_image_path}: {e}")
+
+@functools.lru_cache(maxsize=256)
+def _dir_names(folder: str, mtime: float) -> frozenset:
+    """Names in folder (one scandir), cached per folder and modification time."""
+    try:
+        with os.scandir(folder) as entries:
+            return frozenset(entry.name for entry in entries)
+    except OSError:
+        return frozenset()
+
+
+def _first_existing_path(folders: List[str], base_filename: str, extensions: tuple) -> Optional[str]:
+    """First folder/base_filename+extension that exists, trying every folder for one extension
+    before moving to the next; looked up in cached directory listings instead of one stat per path."""
+    listings = []
+    for folder in folders:
+        try:
+            listings.append((folder, _dir_names(os.path.abspath(folder), os.stat(folder or ".").st_mtime)))
+        except OSError:
+            pass  # Missing folder: nothing to find there
+    for extension in extensions:
+        name = f"{base_filename}{extension}"
+        for folder, names in listings:
+            if name in names:
+                return os.path.join(folder, name)
+    return None
+
+
+@functools.lru_cache(maxsize=256)
+def _plot_folders(village_name: str, sub_village: str) -> tuple:
+    """Folders searched for a sub-village's plot images, in priority order (built once per sub-village)."""
+    sub_village_dir = os.path.join("maps", village_name, "plots", sub_village)
+    # The subfolders only differ in their last part: one shared prefix, as os.path.join would build it
+    prefix = sub_village_dir if sub_village_dir.endswith(os.sep) else f"{sub_village_dir}{os.sep}"
+    return (f"{prefix}contours", f"{prefix}contour", sub_village_dir, f"{prefix}enhanced")
+
+
+# Plot image extensions tried, in order, before any configured one
+_COMMON_EXTS = ('.png', '.jpg', '.jpeg')
+
+
+@functools.lru_cache(maxsize=8)
+def _exts_to_try(configured_extension: str) -> tuple:
+    """_COMMON_EXTS followed by configured_extension unless it is one of them."""
+    return tuple(dict.fromkeys(_COMMON_EXTS + (configured_extension,)))
 
 
 def _find_plot_image_path(best_match_base_filename: str, plots_image_extension: str,
                          village_name: str, best_match_sub_village: str, 
                          plots_folder: str) -> Optional[str]:
     """Find the path to the best match plot image using sophisticated search logic."""
-    best_plot_image_path = None
-    
     # Try multiple extensions
-    extensions_to_try = ['.png', '.jpg', '.jpeg', plots_image_extension]
-    # Remove duplicates while preserving order
-    extensions_to_try = list(dict.fromkeys(extensions_to_try))
+    extensions_to_try = _exts_to_try(plots_image_extension)
     
     # First try the specific sub-village folder
-    for extension in extensions_to_try:
-        potential_plots_paths = [
-            os.path.join("maps", village_name, "plots", best_match_sub_village, "contours", f"{best_match_base_filename}{extension}"),
-            os.path.join("maps", village_name, "plots", best_match_sub_village, "contour", f"{best_match_base_filename}{extension}"),
-            os.path.join("maps", village_name, "plots", best_match_sub_village, f"{best_match_base_filename}{extension}"),
-            os.path.join("maps", village_name, "plots", best_match_sub_village, "enhanced", f"{best_match_base_filename}{extension}")
-        ]
-        
-        for potential_path in potential_plots_paths:
-            if os.path.exists(potential_path):
-                best_plot_image_path = potential_path
-                break
-        
-        if best_plot_image_path:
-            break
+    best_plot_image_path = _first_existing_path(_plot_folders(village_name, best_match_sub_village),
+                                                best_match_base_filename, extensions_to_try)
     
     # Fallback: try the plots_folder parameter if provided (for backwards compatibility)
     if best_plot_image_path is None:
-        for extension in extensions_to_try:
-            potential_plots_paths = [
-                os.path.join(plots_folder, "contours", f"{best_match_base_filename}{extension}"),
-                os.path.join(plots_folder, "contour", f"{best_match_base_filename}{extension}"),
-                os.path.join(plots_folder, f"{best_match_base_filename}{extension}"),
-                os.path.join(plots_folder, "enhanced", f"{best_match_base_filename}{extension}")
-            ]
-            
-            for potential_path in potential_plots_paths:
-                if os.path.exists(potential_path):
-                    best_plot_image_path = potential_path
-                    break
-            
-            if best_plot_image_path:
-                break
+        fallback_folders = [os.path.join(plots_folder, "contours"), os.path.join(plots_folder, "contour"),
+                            plots_folder, os.path.join(plots_folder, "enhanced")]
+        best_plot_image_path = _first_existing_path(fallback_folders, best_match_base_filename, extensions_to_try)
     
     return best_plot_image_path
 
 
 def _add_flipped_reference_image(pdf: PDFReport, reference_image_path: Optional[str],
-                               ref_img_x: float, image_y: float, max_image_height: float) -> Optional[str]:
-    """Add the flipped reference image to the PDF and return the temp file path."""
-    temp_ref_image_path = None
-    
-    if reference_image_path and os.path.exists(reference_image_path):
+                               ref_img_x: float, image_y: float, max_image_height: float,
+                               reference_image_bytes: Optional[bytes] = None) -> None:
+    """Add the flipped reference image to the PDF."""
+    if reference_image_bytes or (reference_image_path and os.path.exists(reference_image_path)):
         try:
-            ref_image = cv2.imread(reference_image_path)
+            if reference_image_bytes:
+                ref_image = cv2.imdecode(np.frombuffer(reference_image_bytes, np.uint8), cv2.IMREAD_COLOR)
+            else:
+                ref_image = cv2.imread(reference_image_path)
             if ref_image is not None:
                 # Convert to grayscale for contour extraction
                 gray = cv2.cvtColor(ref_image, cv2.COLOR_BGR2GRAY)
@@ -299,14 +339,10 @@ def _add_flipped_reference_image(pdf: PDFReport, reference_image_path: Optional[
                 # Flip vertically per original behavior
                 flipped_ref_image = cv2.flip(outline_bgr, 0)
 
-                # Create a named temporary file for the flipped image
-                with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as temp_f:
-                    temp_ref_image_path = temp_f.name
-                if cv2.imwrite(temp_ref_image_path, flipped_ref_image):
-                    pdf.image(temp_ref_image_path, x=ref_img_x, y=image_y, 
-                             w=PDF_IMAGE_WIDTH_SIDE_BY_SIDE, h=max_image_height)
-                else:
-                    raise IOError("Failed to write temporary flipped image.")
+                # fpdf2 embeds a PIL image directly, so no temporary PNG has to be encoded and re-read
+                from PIL import Image
+                pdf.image(Image.fromarray(cv2.cvtColor(flipped_ref_image, cv2.COLOR_BGR2RGB)), x=ref_img_x, y=image_y, 
+                         w=PDF_IMAGE_WIDTH_SIDE_BY_SIDE, h=max_image_height)
             else:
                 raise ValueError("Reference image loaded as None.")
         except Exception as e:
@@ -320,8 +356,49 @@ def _add_flipped_reference_image(pdf: PDFReport, reference_image_path: Optional[
         pdf.multi_cell(PDF_IMAGE_WIDTH_SIDE_BY_SIDE - 10, PDF_LINE_HEIGHT, 
                       "(Reference Image Not Available)", border=1, align='C')
         pdf.set_y(image_y)
-    
-    return temp_ref_image_path
+
+
+def _get_or_make_thumbnail(src_path: str, max_side_px: int) -> str:
+    """Path of a copy of src_path downscaled to at most max_side_px, kept in a `.thumbs` folder next
+    to it, so reports embed small images instead of full-resolution plots. Returns src_path itself if
+    it is already small enough or the copy can't be made."""
+    try:
+        mtime = os.path.getmtime(src_path)
+    except OSError:
+        return src_path
+    return _cached_thumbnail(src_path, mtime, max_side_px)
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_thumbnail(src_path: str, mtime: float, max_side_px: int) -> str:
+    """_get_or_make_thumbnail, cached per path, modification time and size."""
+    # JPEG sources stay JPEG (fpdf2 embeds those without re-encoding); anything else becomes PNG, which keeps line art sharp
+    is_jpeg = os.path.splitext(src_path)[1].lower() in (".jpg", ".jpeg")
+    thumbs_dir = os.path.join(os.path.dirname(src_path), ".thumbs")
+    thumb_path = os.path.join(thumbs_dir, f"{os.path.basename(src_path)}.{max_side_px}{'.jpg' if is_jpeg else '.png'}")
+    try:
+        if os.path.getmtime(thumb_path) >= mtime:
+            return thumb_path
+    except OSError:
+        pass  # Not made yet
+    try:
+        from PIL import Image
+        with Image.open(src_path) as img:
+            if max(img.size) <= max_side_px:
+                return src_path
+            img.thumbnail((max_side_px, max_side_px), Image.LANCZOS)
+            os.makedirs(thumbs_dir, exist_ok=True)
+            # Written via a temp file so readers never see a partial thumbnail
+            tmp_path = f"{thumb_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            if is_jpeg:
+                img.save(tmp_path, "JPEG", quality=85)
+            else:
+                img.save(tmp_path, "PNG")
+            os.replace(tmp_path, thumb_path)
+        return thumb_path
+    except Exception as e:
+        print(f"Warning: Could not create thumbnail for {src_path}: {e}")
+        return src_path
 
 
 def _add_plot_image(pdf: PDFReport, best_plot_image_path: Optional[str],
@@ -330,7 +407,7 @@ def _add_plot_image(pdf: PDFReport, best_plot_image_path: Optional[str],
     pdf.set_x(plot_img_x)
     try:
         if best_plot_image_path and os.path.exists(best_plot_image_path):
-            pdf.image(best_plot_image_path, x=plot_img_x, y=image_y, 
+            pdf.image(_get_or_make_thumbnail(best_plot_image_path, PDF_PLOT_IMAGE_MAX_SIDE_PX), x=plot_img_x, y=image_y, 
                      w=PDF_IMAGE_WIDTH_SIDE_BY_SIDE, h=max_image_height)
         else:
             error_msg = f"(Plot Image Not Found:\n{os.path.basename(best_plot_image_path) if best_plot_image_path else 'Path is None'})"
@@ -360,49 +437,51 @@ def _add_top_matches_details(pdf: PDFReport, top_results_list: List[Dict[str, An
         pdf.cell(0, 10, "No comparison results available.", new_x="LMARGIN", new_y="NEXT")
         return
 
-    page_height = pdf.h - pdf.t_margin - pdf.b_margin  # Printable height
     max_thumb_h = 30  # Height for thumbnails
-    # Estimate required height per item (thumbnail + ~4 lines text + spacing)
-    estimated_item_height = max_thumb_h + (4 * PDF_LINE_HEIGHT / 1.5) + 6  # Approx height needed
-
-    for i, res in enumerate(top_results_list[:top_n_matches]):
-        # Check if we need a new page BEFORE adding the item
-        current_y_before_item = pdf.get_y()
-        # Add a buffer (e.g., 5mm) to avoid placing exactly at the bottom margin
-        if current_y_before_item + estimated_item_height > page_height - 5:
+    thumbnail_x = PDF_MARGIN
+    text_x = thumbnail_x + PDF_THUMBNAIL_WIDTH + 5
+    text_width = PDF_PAGE_WIDTH - PDF_THUMBNAIL_WIDTH - 10
+
+    # Look up and downscale every match's plot image up front on a thread pool (file system and
+    # Pillow work overlaps); the PDF itself is then written item by item
+    top_results = top_results_list[:top_n_matches]
+    prepare = functools.partial(_prepare_match_image, plots_image_extension=plots_image_extension,
+                                village_name=village_name, plots_folder=plots_folder)
+    if len(top_results) <= 1:
+        prepared = [prepare(res) for res in top_results]
+    else:
+        with ThreadPoolExecutor(max_workers=min(8, len(top_results))) as executor:
+            prepared = list(executor.map(prepare, top_results))
+
+    for i, (res, prepared_item) in enumerate(zip(top_results, prepared)):
+        if prepared_item is None:  # No filename or image path to go by
+            continue
+        match_base_filename, match_plot_image_path = prepared_item
+        match_text = _match_text(i, match_base_filename, plots_image_extension, comparison_method, res)
+
+        # Check if we need a new page BEFORE adding the item, using the item's measured height
+        # (thumbnail or wrapped text, whichever is taller) so it never splits across pages.
+        # Auto page break is off while measuring, or the dry run would add (and then drop) a page
+        auto_page_break, bottom_margin = pdf.auto_page_break, pdf.b_margin
+        pdf.set_auto_page_break(False)
+        text_height = pdf.multi_cell(text_width, PDF_DETAIL_LINE_HEIGHT, match_text,
+                                     dry_run=True, output=MethodReturnValue.HEIGHT)
+        pdf.set_auto_page_break(auto_page_break, margin=bottom_margin)
+        item_height = max(max_thumb_h + 2, text_height)
+        if pdf.get_y() + item_height > pdf.page_break_trigger:
             pdf.add_page()
             # Optional: Re-add section header on new page
             pdf.set_font('Helvetica', 'I', 10)
             pdf.cell(0, 6, "... Top Match Details (continued) ...", new_x="LMARGIN", new_y="NEXT")
             pdf.set_font('Helvetica', '', 9)  # Reset font after page break
-            current_y_before_item = pdf.get_y()  # Update Y after potentially adding a page
-
-        # Determine base filename and construct plot image path
-        source_identifier = res.get('filename', res.get('img_path', ''))
-        if not source_identifier:
-            continue
-        match_base_filename = os.path.splitext(os.path.basename(source_identifier))[0]
-        
-        # Get the sub-village for this specific result
-        result_sub_village = res.get('sub_village', '')
-        
-        # Use sophisticated search logic like in the visualization function
-        match_plot_image_path = _find_match_plot_image_path(match_base_filename, 
-                                                           plots_image_extension,
-                                                           village_name, result_sub_village, 
-                                                           plots_folder)
 
         start_y_item = pdf.get_y()  # Y position for this specific item
-        thumbnail_x = PDF_MARGIN
-        text_x = thumbnail_x + PDF_THUMBNAIL_WIDTH + 5
-        text_width = PDF_PAGE_WIDTH - PDF_THUMBNAIL_WIDTH - 10
 
         # Draw Thumbnail Image
         _add_thumbnail_image(pdf, match_plot_image_path, thumbnail_x, start_y_item, max_thumb_h)
 
         # Add Text Details
-        _add_match_text_details(pdf, text_x, start_y_item, text_width, i, match_base_filename,
-                              plots_image_extension, comparison_method, res)
+        _add_match_text_details(pdf, text_x, start_y_item, text_width, match_text)
 
         # Ensure we move below the potentially taller block (image or text) for the next item
         text_end_y = pdf.get_y()  # Get Y position after writing text
@@ -410,6 +489,25 @@ def _add_top_matches_details(pdf: PDFReport, top_results_list: List[Dict[str, An
         pdf.set_y(max(image_end_y, text_end_y))  # Move below the taller element
 
 
+def _prepare_match_image(res: Dict[str, Any], plots_image_extension: str, village_name: str,
+                         plots_folder: str) -> Optional[tuple]:
+    """(base filename, path of the image to embed) for a match, or None if it has no source file.
+    The path is the downscaled thumbnail when the plot image exists."""
+    # Determine base filename and construct plot image path
+    source_identifier = res.get('filename', res.get('img_path', ''))
+    if not source_identifier:
+        return None
+    match_base_filename = os.path.splitext(os.path.basename(source_identifier))[0]
+    
+    # Use sophisticated search logic like in the visualization function
+    match_plot_image_path = _find_match_plot_image_path(match_base_filename, plots_image_extension,
+                                                       village_name, res.get('sub_village', ''),
+                                                       plots_folder)
+    if os.path.exists(match_plot_image_path):
+        match_plot_image_path = _get_or_make_thumbnail(match_plot_image_path, PDF_THUMBNAIL_MAX_SIDE_PX)
+    return match_base_filename, match_plot_image_path
+
+
 def _find_match_plot_image_path(match_base_filename: str, plots_image_extension: str,
                                village_name: str, result_sub_village: str, 
                                plots_folder: str) -> Optional[str]:
@@ -418,30 +516,13 @@ def _find_match_plot_image_path(match_base_filename: str, plots_image_extension:
     
     if result_sub_village:
         # Try multiple extensions including .png
-        for extension in ['.png', '.jpg', '.jpeg']:
-            potential_paths = [
-                os.path.join("maps", village_name, "plots", result_sub_village, "contours", f"{match_base_filename}{extension}"),
-                os.path.join("maps", village_name, "plots", result_sub_village, "contour", f"{match_base_filename}{extension}"),
-                os.path.join("maps", village_name, "plots", result_sub_village, f"{match_base_filename}{extension}"),
-                os.path.join("maps", village_name, "plots", result_sub_village, "enhanced", f"{match_base_filename}{extension}")
-            ]
-            
-            for potential_path in potential_paths:
-                if os.path.exists(potential_path):
-                    match_plot_image_path = potential_path
-                    break
-            
-            if match_plot_image_path:
-                break
+        match_plot_image_path = _first_existing_path(_plot_folders(village_name, result_sub_village),
+                                                     match_base_filename, _COMMON_EXTS)
     
     # Fallback to simple plots_folder path if not found or no sub_village info
     if match_plot_image_path is None:
         # Try multiple extensions for fallback
-        for extension in ['.png', '.jpg', '.jpeg']:
-            fallback_path = os.path.join(plots_folder, f"{match_base_filename}{extension}")
-            if os.path.exists(fallback_path):
-                match_plot_image_path = fallback_path
-                break
+        match_plot_image_path = _first_existing_path([plots_folder], match_base_filename, _COMMON_EXTS)
         
         # Final fallback using the configured extension
         if match_plot_image_path is None:
@@ -470,43 +551,37 @@ def _add_thumbnail_image(pdf: PDFReport, match_plot_image_path: Optional[str],
         pdf.set_y(start_y_item)
 
 
-def _add_match_text_details(pdf: PDFReport, text_x: float, start_y_item: float, 
-                          text_width: float, i: int, match_base_filename: str,
-                          plots_image_extension: str, comparison_method: str, 
-                          res: Dict[str, Any]) -> None:
-    """Add text details for a match result."""
-    pdf.set_xy(text_x, start_y_item)
-    pdf.multi_cell(text_width, PDF_LINE_HEIGHT / 1.5, 
-                   f"{i+1}. Plot: {match_base_filename}{plots_image_extension}")
+def _match_text(i: int, match_base_filename: str, plots_image_extension: str,
+                comparison_method: str, res: Dict[str, Any]) -> str:
+    """Text details for a match result, one line per detail."""
+    lines = [f"{i+1}. Plot: {match_base_filename}{plots_image_extension}"]
     
     if comparison_method == 'standard':
         iou_note = " (Prioritized)" if res.get('iou_transform') == "Flipped Vertically" else ""
         haus_note = " (Prioritized)" if res.get('hausdorff_transform') == "Flipped Vertically" else ""
-        haus_dist_str = f"{res.get('hausdorff', float('inf')):.2f}" if res.get('hausdorff', float('inf')) != float('inf') else "Inf/Error"
+        haus_dist = res.get('hausdorff', float('inf'))
+        # None: an infinite distance that went through JSON as null
+        haus_dist_str = f"{haus_dist:.2f}" if haus_dist is not None and haus_dist != float('inf') else "Inf/Error"
         
-        pdf.set_x(text_x)
-        pdf.multi_cell(text_width, PDF_LINE_HEIGHT / 1.5, 
-                      f"   IoU: {res.get('iou', 0.0):.4f} (T: {res.get('iou_transform', 'N/A')}{iou_note})")
-        pdf.set_x(text_x)
-        pdf.multi_cell(text_width, PDF_LINE_HEIGHT / 1.5, 
-                      f"   Hausdorff: {haus_dist_str} (T: {res.get('hausdorff_transform', 'N/A')}{haus_note})")
-        pdf.set_x(text_x)
-        pdf.multi_cell(text_width, PDF_LINE_HEIGHT / 1.5, 
-                      f"   Source DAT: {res.get('filename', 'N/A')}")
-        pdf.set_x(text_x)
-        pdf.multi_cell(text_width, PDF_LINE_HEIGHT / 1.5, 
-                      f"   Sub-village: {res.get('sub_village', 'N/A')}")
+        lines += [f"   IoU: {res.get('iou', 0.0):.4f} (T: {res.get('iou_transform', 'N/A')}{iou_note})",
+                  f"   Hausdorff: {haus_dist_str} (T: {res.get('hausdorff_transform', 'N/A')}{haus_note})",
+                  f"   Source DAT: {res.get('filename', 'N/A')}",
+                  f"   Sub-village: {res.get('sub_village', 'N/A')}"]
 
     elif comparison_method == 'advanced':
-        pdf.set_x(text_x)
-        pdf.multi_cell(text_width, PDF_LINE_HEIGHT / 1.5, 
-                      f"   VGG Similarity: {res.get('similarity', 0.0):.4f}")
-        pdf.set_x(text_x)
-        pdf.multi_cell(text_width, PDF_LINE_HEIGHT / 1.5, 
-                      f"   Source Image: {os.path.basename(res.get('img_path', 'N/A'))}")
-        pdf.set_x(text_x)
-        pdf.multi_cell(text_width, PDF_LINE_HEIGHT / 1.5, 
-                      f"   Sub-village: {res.get('sub_village', 'N/A')}")
+        lines += [f"   VGG Similarity: {res.get('similarity', 0.0):.4f}",
+                  f"   Source Image: {os.path.basename(res.get('img_path', 'N/A'))}",
+                  f"   Sub-village: {res.get('sub_village', 'N/A')}"]
+
+    return "\n".join(lines)
+
+
+def _add_match_text_details(pdf: PDFReport, text_x: float, start_y_item: float, 
+                          text_width: float, match_text: str) -> None:
+    """Add text details for a match result."""
+    # One multi_cell for the whole block: every line starts at text_x, as separate cells did
+    pdf.set_xy(text_x, start_y_item)
+    pdf.multi_cell(text_width, PDF_DETAIL_LINE_HEIGHT, match_text)
 
 
 def _save_pdf(pdf: PDFReport, pdf_filename: str) -> None: